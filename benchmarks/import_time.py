@@ -0,0 +1,83 @@
+"""
+Measure the import time of wagtail_pdf_view
+
+Every measurement runs in a fresh interpreter, which sets up django with the given settings
+and imports the given modules afterwards. The script reports the import time and whether
+the PDF engine (weasyprint) was loaded as side effect.
+
+Usage (from the repository root):
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --settings demo.settings.dev --module wagtail_pdf_view.mixins --repeat 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE = """
+import importlib, json, resource, sys, time
+
+import django
+django.setup()
+
+start = time.perf_counter()
+for module in {modules!r}:
+    importlib.import_module(module)
+duration = time.perf_counter() - start
+
+print(json.dumps({{
+    'duration': duration,
+    'maxrss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'engines': [name for name in ('weasyprint', 'django_weasyprint', 'fontTools', 'pydyf') if name in sys.modules],
+}}))
+"""
+
+
+def measure(modules, settings, repeat):
+    env = dict(os.environ)
+    env['DJANGO_SETTINGS_MODULE'] = settings
+    env['PYTHONPATH'] = os.pathsep.join([ROOT, os.path.join(ROOT, 'demo'), env.get('PYTHONPATH', '')])
+
+    results = []
+
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', MEASURE.format(modules=modules)],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--settings', default='demo.settings.dev')
+    parser.add_argument('--module', action='append', dest='modules')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    modules = args.modules or ['wagtail_pdf_view.mixins', 'wagtail_pdf_view.views']
+
+    results = measure(modules, args.settings, args.repeat)
+    durations = [r['duration'] for r in results]
+
+    print(f"modules:        {', '.join(modules)}")
+    print(f"import time:    median {statistics.median(durations) * 1000:.1f}ms, min {min(durations) * 1000:.1f}ms ({args.repeat} runs)")
+    print(f"max rss:        {statistics.median(r['maxrss'] for r in results) / 1024:.1f}MB")
+    print(f"engine modules: {', '.join(results[0]['engines']) or 'none'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+import os
+
+import django
+
+
+def pytest_configure(config):
+    """
+    Configure django with the settings of the demo project, unless pytest-django does it already
+    """
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "demo.settings.dev")
+
+    if not config.pluginmanager.hasplugin("django"):
+        django.setup()
@@ -47,6 +47,9 @@ class Invoice(PdfModelMixin, ClusterableModel):
     
     stylesheets = ["invoice.css"]
     
+    # load all items with a single query
+    pdf_prefetch_related = ["items"]
+    
     @property
     def total_price(self):
         
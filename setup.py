@@ -26,7 +26,12 @@ setuptools.setup(
     url='https://github.com/donhauser/wagtail-pdf',
     packages=[
         'wagtail_pdf_view',
+        'wagtail_pdf_view.management',
+        'wagtail_pdf_view.management.commands',
+        'wagtail_pdf_view.templatetags',
         'wagtail_pdf_view_tex',
+        'wagtail_pdf_view_tex.management',
+        'wagtail_pdf_view_tex.management.commands',
     ],
     package_data={
         '': ['LICENSE']
@@ -38,6 +43,8 @@ setuptools.setup(
     install_requires=["wagtail", "django-weasyprint"],
     extras_require = {
         'django-tex':["django-tex"],
+        'brotli':["brotli"],
+        'pikepdf':["pikepdf"],
     },
     classifiers = [
         "Development Status :: 5 - Production/Stable",
@@ -0,0 +1,18 @@
+from django.apps import AppConfig
+
+
+class WagtailPdfViewAppConfig(AppConfig):
+    name = 'wagtail_pdf_view'
+    label = 'wagtail_pdf_view'
+    verbose_name = "Wagtail PDF view"
+
+    #: the report of the warmup (see WAGTAIL_PDF_WARMUP), once it is finished
+    warmup_report = None
+
+    def ready(self):
+        from django.core.signals import request_started
+
+        from .warmup import WAGTAIL_PDF_WARMUP, warmup_on_first_request
+
+        if WAGTAIL_PDF_WARMUP:
+            request_started.connect(warmup_on_first_request)
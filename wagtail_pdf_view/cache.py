@@ -0,0 +1,182 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+"""
+Cache for rendered PDF documents
+
+The documents are stored under their fingerprint, a hash of the rendered template source,
+the compiler options and the post-processing steps. An edit of an object therefore never
+serves outdated documents, no invalidation is required.
+
+e.g. WAGTAIL_PDF_CACHE = {'cache': 'default', 'timeout': 3600}
+"""
+WAGTAIL_PDF_CACHE = getattr(settings, 'WAGTAIL_PDF_CACHE', None)
+
+WAGTAIL_PDF_CACHE_DEFAULTS = {
+    # alias of the django cache
+    'cache': 'default',
+    # lifetime of a cached document in seconds
+    'timeout': 60 * 60,
+    'prefix': 'wagtail_pdf_view',
+    # change the version to invalidate all documents, e.g. after fonts or images of the stylesheets were updated
+    'version': None,
+}
+
+
+def get_cache_options():
+    if not WAGTAIL_PDF_CACHE:
+        return None
+
+    if isinstance(WAGTAIL_PDF_CACHE, dict):
+        return {**WAGTAIL_PDF_CACHE_DEFAULTS, **WAGTAIL_PDF_CACHE}
+
+    return dict(WAGTAIL_PDF_CACHE_DEFAULTS)
+
+
+def is_cache_enabled():
+    return get_cache_options() is not None
+
+
+class FingerprintEncoder(DjangoJSONEncoder):
+    """
+    JSON encoder, which is stable across processes
+
+    Sets are sorted, paths are encoded as strings and other objects (e.g. an url fetcher) only by their type,
+    as their repr() may contain their memory address.
+    """
+
+    def default(self, o):
+        if isinstance(o, (set, frozenset)):
+            return sorted(o, key=lambda item: json.dumps(item, sort_keys=True, cls=FingerprintEncoder))
+
+        if isinstance(o, os.PathLike):
+            return os.fspath(o)
+
+        if isinstance(o, bytes):
+            return hashlib.sha256(o).hexdigest()
+
+        try:
+            return super().default(o)
+        except TypeError:
+            return f"{type(o).__module__}.{type(o).__qualname__}"
+
+
+def encode_fingerprint_part(part):
+    """
+    Canonical JSON of a fingerprint part, e.g. a dict of options
+    """
+
+    if isinstance(part, dict):
+        # the keys may be of any (sortable) type
+        part = [[key, value] for key, value in sorted(part.items(), key=lambda item: repr(item[0]))]
+
+    return json.dumps(part, sort_keys=True, cls=FingerprintEncoder)
+
+
+def get_fingerprint(*parts):
+    """
+    Hash the given parts into a document fingerprint
+
+    Strings and bytes are hashed as they are, any other part by its canonical JSON (see FingerprintEncoder).
+    """
+
+    digest = hashlib.sha256()
+
+    for part in parts:
+        if not isinstance(part, (str, bytes)):
+            part = encode_fingerprint_part(part)
+
+        if isinstance(part, str):
+            part = part.encode()
+
+        # separate the parts unambiguously
+        digest.update(str(len(part)).encode() + b":" + part)
+
+    return digest.hexdigest()
+
+
+def get_cache_key(fingerprint, *suffixes):
+    options = get_cache_options()
+
+    return ":".join([options['prefix'], fingerprint, *suffixes])
+
+
+def get_cached_pdf(fingerprint, *suffixes):
+    """
+    The cached document for the fingerprint or None
+    """
+
+    options = get_cache_options()
+
+    if options is None:
+        return None
+
+    return caches[options['cache']].get(get_cache_key(fingerprint, *suffixes), version=options['version'])
+
+
+def set_cached_pdf(fingerprint, content, *suffixes, timeout=None):
+    options = get_cache_options()
+
+    if options is None:
+        return
+
+    caches[options['cache']].set(
+        get_cache_key(fingerprint, *suffixes),
+        content,
+        timeout=options['timeout'] if timeout is None else timeout,
+        version=options['version'],
+    )
+
+
+async def aget_cached_pdf(fingerprint, *suffixes):
+    options = get_cache_options()
+
+    if options is None:
+        return None
+
+    return await caches[options['cache']].aget(get_cache_key(fingerprint, *suffixes), version=options['version'])
+
+
+async def aset_cached_pdf(fingerprint, content, *suffixes, timeout=None):
+    options = get_cache_options()
+
+    if options is None:
+        return
+
+    await caches[options['cache']].aset(
+        get_cache_key(fingerprint, *suffixes),
+        content,
+        timeout=options['timeout'] if timeout is None else timeout,
+        version=options['version'],
+    )
+
+
+def get_latest_pdf(*key):
+    """
+    The latest rendered version of a document ({'fingerprint': ..., 'stale_since': ...}) or None
+
+    The key identifies the document independent of its content, e.g. by model, pk and render options.
+    """
+
+    return get_cached_pdf('latest', *key)
+
+
+def set_latest_pdf(latest, *key):
+    set_cached_pdf('latest', latest, *key)
+
+
+async def aget_latest_pdf(*key):
+    return await aget_cached_pdf('latest', *key)
+
+
+async def aset_latest_pdf(latest, *key):
+    await aset_cached_pdf('latest', latest, *key)
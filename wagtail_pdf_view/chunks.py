@@ -0,0 +1,52 @@
+from wagtail.blocks import StreamValue
+
+import copy
+
+
+class ChunkedSource(list):
+    """
+    The sources of a document, which is rendered in chunks (see BasePdfMixin.get_pdf_chunks)
+    """
+
+
+def split_stream_value(value, break_types):
+    """
+    Split a StreamValue before every block of the given types
+
+    Returns a list of StreamValues, the blocks before the first break form their own chunk.
+    """
+
+    chunks = [[]]
+
+    for child in value:
+        if child.block_type in break_types and chunks[-1]:
+            chunks.append([])
+
+        chunks[-1].append((child.block_type, child.value, child.id))
+
+    return [StreamValue(value.stream_block, chunk) for chunk in chunks if chunk]
+
+
+def copy_with(obj, **attrs):
+    """
+    Shallow copy of the object with the given attributes replaced
+    """
+
+    obj = copy.copy(obj)
+
+    for name, value in attrs.items():
+        setattr(obj, name, value)
+
+    return obj
+
+
+def render_chunk(response_class, kwargs, source, page_offset=0):
+    """
+    Lay out a single chunk (in a worker process)
+
+    Returns the PDF of the chunk and its number of pages.
+    """
+
+    response = response_class(None, None, **kwargs)
+
+    return response.render_pdf_chunk(source, page_offset)
@@ -0,0 +1,651 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections
+
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+
+import asyncio
+import django
+import collections
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import weakref
+
+from .cache import aget_cached_pdf, get_cached_pdf
+
+try:
+    import fcntl
+except ImportError:
+    # not available on windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+"""
+The number of threads rendering PDF documents for async views, defaults to the number of CPUs
+"""
+WAGTAIL_PDF_RENDER_WORKERS = getattr(settings, 'WAGTAIL_PDF_RENDER_WORKERS', None)
+
+"""
+The number of processes laying out the chunks of chunked documents, defaults to the number of CPUs
+"""
+WAGTAIL_PDF_CHUNK_PROCESSES = getattr(settings, 'WAGTAIL_PDF_CHUNK_PROCESSES', None)
+
+"""
+Limit the number of concurrent renders, True uses the defaults, a dict can be used to change them
+
+By default the limit applies within a process, i.e. to threaded or async servers. With a 'lock_directory'
+the limit is shared by all processes of the host (e.g. gunicorn's sync workers), which take file locks as slots.
+Only the layout is admitted, the template is rendered (and the document fingerprinted) before.
+"""
+WAGTAIL_PDF_RENDER_CONCURRENCY = getattr(settings, 'WAGTAIL_PDF_RENDER_CONCURRENCY', False)
+
+WAGTAIL_PDF_RENDER_CONCURRENCY_DEFAULTS = {
+    # concurrently running renders, defaults to the number of CPUs
+    'limit': None,
+    # renders waiting for a free slot, further renders are rejected immediately
+    'queue': 10,
+    # seconds a render waits for a free slot before it is rejected
+    'timeout': 30,
+    # value of the Retry-After header of rejected requests (in seconds)
+    'retry_after': 10,
+    # directory of the slot lock files, which share the limit between the processes of the host
+    'lock_directory': None,
+}
+
+"""
+Concurrent renders of the same document (i.e. with the same fingerprint) wait for a single render and share its result
+"""
+WAGTAIL_PDF_COALESCE_RENDERS = getattr(settings, 'WAGTAIL_PDF_COALESCE_RENDERS', True)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# asyncio primitives are bound to the event loop they are used with
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def get_render_workers():
+    return WAGTAIL_PDF_RENDER_WORKERS or os.cpu_count() or 1
+
+
+def get_render_executor():
+    """
+    The executor which renders the documents of async views (created on first use)
+    """
+
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_render_workers(),
+                thread_name_prefix="wagtail-pdf-render",
+            )
+
+    return _executor
+
+
+_chunk_executor = None
+
+
+def get_chunk_executor():
+    """
+    The process pool, which lays out the chunks of chunked documents (created on first use)
+    """
+
+    global _chunk_executor
+
+    with _executor_lock:
+        if _chunk_executor is None:
+            # forked children would inherit the locks and threads (e.g. the render executor) of this process
+            _chunk_executor = ProcessPoolExecutor(
+                max_workers=WAGTAIL_PDF_CHUNK_PROCESSES or os.cpu_count() or 1,
+                initializer=django.setup,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+
+    return _chunk_executor
+
+
+def get_render_semaphore():
+    loop = asyncio.get_running_loop()
+
+    try:
+        return _semaphores[loop]
+    except KeyError:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(get_render_workers())
+        return semaphore
+
+
+def _run_render(func, *args, **kwargs):
+    # the render threads don't serve requests, i.e. their connections are not closed by django
+    close_old_connections()
+
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_render(func, *args, **kwargs):
+    """
+    Run a blocking render function in the render executor without blocking the event loop
+
+    Renders waiting for a free worker wait on a semaphore (instead of queueing up in the executor).
+    """
+
+    async with get_render_semaphore():
+        loop = asyncio.get_running_loop()
+
+        return await loop.run_in_executor(
+            get_render_executor(),
+            functools.partial(_run_render, func, *args, **kwargs),
+        )
+
+
+class RenderUnavailable(Exception):
+    """
+    The render was rejected, as too many renders are running or waiting
+    """
+
+    def __init__(self, retry_after=None):
+        super().__init__("Too many concurrent renders")
+        self.retry_after = retry_after
+
+
+class _ThreadWaiter:
+    admitted = False
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def wake(self):
+        self.event.set()
+
+
+class _AsyncWaiter:
+    admitted = False
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+
+    def _set_result(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+    def wake(self):
+        self.loop.call_soon_threadsafe(self._set_result)
+
+
+class SharedRenderSlots:
+    """
+    Render slots shared by the processes of a host
+
+    Each slot is an exclusive lock (flock) of a file in the directory. The locks are released by the
+    operating system if a process dies, i.e. crashed workers don't leak slots.
+    """
+
+    poll_interval = 0.05
+
+    def __init__(self, directory, limit, timeout=None):
+        if fcntl is None:
+            raise ImproperlyConfigured("WAGTAIL_PDF_RENDER_CONCURRENCY 'lock_directory' requires fcntl (unix)")
+
+        os.makedirs(directory, exist_ok=True)
+
+        self.paths = [os.path.join(directory, f"render-slot-{index}.lock") for index in range(limit)]
+        self.timeout = timeout
+
+    def try_acquire(self):
+        """
+        The file descriptor of a free slot (locked) or None
+        """
+
+        for path in self.paths:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+            else:
+                return fd
+
+        return None
+
+    def get_deadline(self):
+        return None if self.timeout is None else time.monotonic() + self.timeout
+
+    def is_expired(self, deadline):
+        return deadline is not None and time.monotonic() >= deadline
+
+    def acquire(self):
+        """
+        Wait for a free slot, returns its file descriptor or None on timeout
+        """
+
+        deadline = self.get_deadline()
+
+        while (fd := self.try_acquire()) is None:
+            if self.is_expired(deadline):
+                return None
+
+            time.sleep(self.poll_interval)
+
+        return fd
+
+    async def aacquire(self):
+        deadline = self.get_deadline()
+
+        while (fd := self.try_acquire()) is None:
+            if self.is_expired(deadline):
+                return None
+
+            await asyncio.sleep(self.poll_interval)
+
+        return fd
+
+    def release(self, fd):
+        # closing the file releases its lock
+        os.close(fd)
+
+
+class RenderAdmission:
+    """
+    Admission control for renders with a bounded wait queue
+
+    The slots are shared by threads and async tasks of a process. Released slots are handed over to
+    the waiters in order of their arrival. With a lock directory, admitted renders additionally wait
+    for one of the slots shared by all processes of the host (see SharedRenderSlots).
+    """
+
+    def __init__(self, limit, queue=0, timeout=None, retry_after=None, lock_directory=None):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+
+        self.shared = SharedRenderSlots(lock_directory, limit, timeout) if lock_directory else None
+
+        self.running = 0
+        self.waiters = collections.deque()
+        self.rejected = 0
+
+        self._lock = threading.Lock()
+
+    def _try_admit(self, waiter_factory):
+        """
+        Take a free slot (None) or enqueue a new waiter
+        """
+
+        with self._lock:
+            if self.running < self.limit:
+                self.running += 1
+                return None
+
+            if len(self.waiters) >= self.queue:
+                self.rejected += 1
+                raise RenderUnavailable(self.retry_after)
+
+            waiter = waiter_factory()
+            self.waiters.append(waiter)
+
+            return waiter
+
+    def _leave(self, waiter, reject=True):
+        """
+        Return whether the waiter was admitted, otherwise it is removed from the queue
+        """
+
+        with self._lock:
+            if waiter.admitted:
+                return True
+
+            self.waiters.remove(waiter)
+
+            if reject:
+                self.rejected += 1
+
+            return False
+
+    def _reject_shared(self):
+        with self._lock:
+            self.rejected += 1
+
+        self.release()
+
+        raise RenderUnavailable(self.retry_after)
+
+    def acquire(self):
+        """
+        Wait for a slot, returns the shared slot (see release) or raises RenderUnavailable
+        """
+
+        waiter = self._try_admit(_ThreadWaiter)
+
+        if waiter is not None:
+            waiter.event.wait(self.timeout)
+
+            if not self._leave(waiter):
+                raise RenderUnavailable(self.retry_after)
+
+        if self.shared is None:
+            return None
+
+        try:
+            slot = self.shared.acquire()
+        except BaseException:
+            self.release()
+            raise
+
+        if slot is None:
+            self._reject_shared()
+
+        return slot
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+
+        waiter = self._try_admit(lambda: _AsyncWaiter(loop))
+
+        if waiter is not None:
+            try:
+                # unlike wait_for(), wait() doesn't cancel the future on timeout
+                await asyncio.wait({waiter.future}, timeout=self.timeout)
+            except asyncio.CancelledError:
+                # pass the slot on, if it was handed over in the meantime
+                if self._leave(waiter, reject=False):
+                    self.release()
+                raise
+
+            if not self._leave(waiter):
+                raise RenderUnavailable(self.retry_after)
+
+        if self.shared is None:
+            return None
+
+        try:
+            slot = await self.shared.aacquire()
+        except BaseException:
+            self.release()
+            raise
+
+        if slot is None:
+            self._reject_shared()
+
+        return slot
+
+    def release(self, slot=None):
+        if slot is not None:
+            self.shared.release(slot)
+
+        with self._lock:
+            if self.waiters:
+                waiter = self.waiters.popleft()
+                waiter.admitted = True
+                waiter.wake()
+            else:
+                self.running -= 1
+
+
+_admission = None
+_admission_lock = threading.Lock()
+
+
+def get_render_admission():
+    """
+    The admission control of this process or None if WAGTAIL_PDF_RENDER_CONCURRENCY is disabled
+    """
+
+    global _admission
+
+    if not WAGTAIL_PDF_RENDER_CONCURRENCY:
+        return None
+
+    with _admission_lock:
+        if _admission is None:
+            options = dict(WAGTAIL_PDF_RENDER_CONCURRENCY_DEFAULTS)
+
+            if isinstance(WAGTAIL_PDF_RENDER_CONCURRENCY, dict):
+                options.update(WAGTAIL_PDF_RENDER_CONCURRENCY)
+
+            options['limit'] = options['limit'] or get_render_workers()
+
+            _admission = RenderAdmission(**options)
+
+    return _admission
+
+
+@contextmanager
+def admit_render():
+    """
+    Wait for a render slot, raises RenderUnavailable if the render is rejected
+    """
+
+    admission = get_render_admission()
+
+    if admission is None:
+        yield
+        return
+
+    slot = admission.acquire()
+
+    try:
+        yield
+    finally:
+        admission.release(slot)
+
+
+@asynccontextmanager
+async def aadmit_render():
+    admission = get_render_admission()
+
+    if admission is None:
+        yield
+        return
+
+    slot = await admission.aacquire()
+
+    try:
+        yield
+    finally:
+        admission.release(slot)
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into a single call
+
+    The first caller (sync or async) runs the function, all callers arriving before it
+    finished wait for its result (or exception).
+    """
+
+    def __init__(self):
+        self.calls = {}
+
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        """
+        The future of the running call for key and whether the caller has to run it
+        """
+
+        with self._lock:
+            future = self.calls.get(key)
+
+            if future is not None:
+                return future, False
+
+            future = self.calls[key] = Future()
+
+            return future, True
+
+    def _finish(self, key, future, result=None, exception=None):
+        with self._lock:
+            del self.calls[key]
+
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def do(self, key, func, *args, **kwargs):
+        future, leader = self._join(key)
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, future, exception=e)
+            raise
+
+        self._finish(key, future, result)
+
+        return result
+
+    async def ado(self, key, func, *args, **kwargs):
+        future, leader = self._join(key)
+
+        if leader:
+            # the call runs as separate task, i.e. it is not cancelled with the leading request
+            task = asyncio.ensure_future(func(*args, **kwargs))
+
+            def finish(task):
+                if task.cancelled():
+                    self._finish(key, future, exception=asyncio.CancelledError())
+                elif task.exception() is not None:
+                    self._finish(key, future, exception=task.exception())
+                else:
+                    self._finish(key, future, task.result())
+
+            task.add_done_callback(finish)
+
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+
+render_flight = SingleFlight()
+
+
+def coalesce_render(fingerprint, func, *args, **kwargs):
+    """
+    Run the render function once for concurrent renders of the same document
+    """
+
+    if not WAGTAIL_PDF_COALESCE_RENDERS:
+        return func(*args, **kwargs)
+
+    return render_flight.do(fingerprint, func, *args, **kwargs)
+
+
+async def acoalesce_render(fingerprint, func, *args, **kwargs):
+    if not WAGTAIL_PDF_COALESCE_RENDERS:
+        return await func(*args, **kwargs)
+
+    return await render_flight.ado(fingerprint, func, *args, **kwargs)
+
+
+# references to the running background tasks, which would be garbage collected otherwise
+_background_tasks = set()
+
+
+def _log_refresh_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Background render failed", exc_info=future.exception())
+
+
+def submit_render(func, *args, **kwargs):
+    """
+    Run the render function in the background (render executor), returns its future
+    """
+
+    future = get_render_executor().submit(_run_render, func, *args, **kwargs)
+    future.add_done_callback(_log_refresh_error)
+
+    return future
+
+
+# fingerprints of the documents rendered in the background, i.e. each document is refreshed once at a time
+_refreshes = set()
+_refreshes_lock = threading.Lock()
+
+
+def _begin_refresh(fingerprint):
+    """
+    Whether the caller has to refresh the document, i.e. it isn't rendered (or refreshed) already
+    """
+
+    with _refreshes_lock:
+        if fingerprint in _refreshes or fingerprint in render_flight.calls:
+            return False
+
+        _refreshes.add(fingerprint)
+
+        return True
+
+
+def _end_refresh(fingerprint, future):
+    with _refreshes_lock:
+        _refreshes.discard(fingerprint)
+
+
+def _refresh(fingerprint, func, *args, **kwargs):
+    # the document may have been rendered while the refresh was queued
+    if get_cached_pdf(fingerprint) is not None:
+        return None
+
+    return coalesce_render(fingerprint, func, *args, **kwargs)
+
+
+async def _arefresh(fingerprint, func, *args, **kwargs):
+    if await aget_cached_pdf(fingerprint) is not None:
+        return None
+
+    return await acoalesce_render(fingerprint, func, *args, **kwargs)
+
+
+def refresh_render(fingerprint, func, *args, **kwargs):
+    """
+    Run the render function in the background (render executor), unless the document is already rendered
+    """
+
+    if not _begin_refresh(fingerprint):
+        return None
+
+    try:
+        future = submit_render(_refresh, fingerprint, func, *args, **kwargs)
+    except BaseException:
+        _end_refresh(fingerprint, None)
+        raise
+
+    future.add_done_callback(functools.partial(_end_refresh, fingerprint))
+
+    return future
+
+
+def arefresh_render(fingerprint, func, *args, **kwargs):
+    """
+    Run the async render function as background task, unless the document is already rendered
+    """
+
+    if not _begin_refresh(fingerprint):
+        return None
+
+    task = asyncio.ensure_future(_arefresh(fingerprint, func, *args, **kwargs))
+
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    task.add_done_callback(functools.partial(_end_refresh, fingerprint))
+    task.add_done_callback(_log_refresh_error)
+
+    return task
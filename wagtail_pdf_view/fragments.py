@@ -0,0 +1,128 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
+from django.utils import translation
+
+import functools
+import json
+import os
+
+from .cache import get_fingerprint
+
+
+"""
+Cache the rendered output of StreamField blocks, which are rendered with the cached include block tags.
+True uses the defaults, a dict can be used to change them.
+"""
+WAGTAIL_PDF_BLOCK_CACHE = getattr(settings, 'WAGTAIL_PDF_BLOCK_CACHE', False)
+
+WAGTAIL_PDF_BLOCK_CACHE_DEFAULTS = {
+    'cache': 'default',
+    'timeout': 3600,
+    'prefix': 'wagtail_pdf_view/block',
+    # change the version to invalidate the fragments, e.g. after templates included by the block templates changed
+    'version': None,
+}
+
+
+def get_block_cache_options():
+    """
+    The block cache options or None if WAGTAIL_PDF_BLOCK_CACHE is disabled
+    """
+
+    if not WAGTAIL_PDF_BLOCK_CACHE:
+        return None
+
+    options = dict(WAGTAIL_PDF_BLOCK_CACHE_DEFAULTS)
+
+    if isinstance(WAGTAIL_PDF_BLOCK_CACHE, dict):
+        options.update(WAGTAIL_PDF_BLOCK_CACHE)
+
+    return options
+
+
+@functools.lru_cache(maxsize=None)
+def get_template_path(template_name):
+    """
+    The file of the template or None (e.g. templates, which are not loaded from files)
+    """
+
+    try:
+        origin = getattr(get_template(template_name), 'origin', None)
+    except TemplateDoesNotExist:
+        return None
+
+    return getattr(origin, 'name', None)
+
+
+def get_block_template_version(template_name):
+    """
+    The template and the modification time and size of its file, so that edited templates aren't served from the cache
+    """
+
+    if not template_name:
+        return None
+
+    path = get_template_path(template_name)
+
+    try:
+        stat = os.stat(path) if path else None
+    except OSError:
+        stat = None
+
+    return [template_name, stat and stat.st_mtime_ns, stat and stat.st_size]
+
+
+def get_block_fingerprint(bound_block, engine):
+    """
+    Identifies the output of a bound block (e.g. an item of a StreamValue) or None if it can't be cached
+
+    The fingerprint consists of the engine, the block class, the block template (and the modification time of its file),
+    the active language, the block id and the value of the block.
+    Blocks can opt out with `pdf_cache = False` in their Meta class.
+    """
+
+    block = getattr(bound_block, 'block', None)
+
+    if block is None or not getattr(block.meta, 'pdf_cache', True):
+        return None
+
+    value = json.dumps(block.get_prep_value(bound_block.value), sort_keys=True, cls=DjangoJSONEncoder)
+
+    return get_fingerprint(
+        engine,
+        f"{type(block).__module__}.{type(block).__qualname__}",
+        block.name,
+        get_block_template_version(getattr(block.meta, 'template', None)),
+        translation.get_language(),
+        getattr(bound_block, 'id', None),
+        value,
+    )
+
+
+def render_block_cached(bound_block, engine, render):
+    """
+    Take the output of the block from the cache or render it with render()
+
+    The output must only depend on the value of the block, not on the template context.
+    """
+
+    options = get_block_cache_options()
+
+    fingerprint = options and get_block_fingerprint(bound_block, engine)
+
+    if not fingerprint:
+        return render()
+
+    cache = caches[options['cache']]
+    key = f"{options['prefix']}:{fingerprint}"
+
+    output = cache.get(key, version=options['version'])
+
+    if output is None:
+        output = render()
+        cache.set(key, str(output), timeout=options['timeout'], version=options['version'])
+
+    return output
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from wagtail_pdf_view.storage import clear_stored_pdfs, get_storage_options
+
+
+class Command(BaseCommand):
+    """
+    Delete outdated documents from the storage (see WAGTAIL_PDF_STORAGE)
+
+    Documents are named by their fingerprint, i.e. changed objects leave their previous documents behind.
+    Run the command periodically (e.g. by a cron job), deleted documents are rendered again if required.
+    """
+
+    help = "Delete the stored pdf documents, which are older than WAGTAIL_PDF_STORAGE['max_age']"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-age",
+            type=int,
+            help="Delete documents older than this age (in seconds), 0 deletes all documents",
+        )
+
+    def handle(self, *args, max_age=None, **options):
+        storage_options = get_storage_options()
+
+        if storage_options is None:
+            raise CommandError("WAGTAIL_PDF_STORAGE is not enabled")
+
+        if max_age is None:
+            max_age = storage_options['max_age']
+
+        deleted = clear_stored_pdfs(max_age)
+
+        self.stdout.write(f"Deleted {deleted} stored documents")
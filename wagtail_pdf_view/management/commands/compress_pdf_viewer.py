@@ -0,0 +1,119 @@
+import gzip
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from wagtail_pdf_view.utils import PDF_VIEWER, PDF_VIEWER_VERSION_FILE, PRECOMPRESSED_SUFFIXES, compute_pdf_viewer_version
+
+
+# binary formats, which are compressed already
+SKIPPED_EXTENSIONS = ('.png', '.gif', '.jpg', '.jpeg', '.pdf', '.woff', '.woff2')
+
+
+class Command(BaseCommand):
+    """
+    Create precompressed variants of the pdf viewer assets
+
+    For every file a '.gz' and (if the package 'brotli' is installed) a '.br' variant is written
+    next to the original, which are served by the viewer asset view (or e.g. nginx gzip_static)
+    according to the Accept-Encoding of the client.
+
+    The version of the viewer (i.e. the hash in its immutable urls) is written to a version file,
+    so that workers don't hash the viewer themselves. Run the command again after updating the viewer.
+    """
+
+    help = "Create gzip/brotli variants of the pdf viewer files"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--root",
+            help="Directory with the viewer files (default: WAGTAIL_PDF_VIEWER['document_root'])",
+        )
+        parser.add_argument(
+            "--min-size",
+            type=int,
+            default=512,
+            help="Files smaller than this size (in bytes) are not compressed",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Recreate existing variants",
+        )
+        parser.add_argument(
+            "--version-only",
+            action="store_true",
+            help="Only write the version file",
+        )
+
+    def compress(self, path, suffix, compressor, force):
+        target = path + suffix
+
+        if not force and os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+            return False
+
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        compressed = compressor(content)
+
+        # A variant, which is not smaller than the original, is useless
+        if len(compressed) >= len(content):
+            if os.path.exists(target):
+                os.remove(target)
+            return False
+
+        with open(target, 'wb') as f:
+            f.write(compressed)
+
+        return True
+
+    def write_version(self, root):
+        version = compute_pdf_viewer_version(root)
+
+        with open(os.path.join(root, PDF_VIEWER_VERSION_FILE), 'w') as f:
+            f.write(version + '\n')
+
+        self.stdout.write(f"Wrote version {version} to '{PDF_VIEWER_VERSION_FILE}'")
+
+    def handle(self, *args, root=None, min_size=512, force=False, version_only=False, **options):
+        root = root or PDF_VIEWER.get('document_root')
+
+        if not root or not os.path.isdir(root):
+            raise CommandError(f"The viewer directory '{root}' does not exist")
+
+        root = os.path.normpath(root)
+
+        self.write_version(root)
+
+        if version_only:
+            return
+
+        compressors = [('.gz', lambda content: gzip.compress(content, compresslevel=9, mtime=0))]
+
+        if brotli is not None:
+            compressors.append(('.br', lambda content: brotli.compress(content, quality=11)))
+        else:
+            self.stderr.write("The package 'brotli' is not installed, only gzip variants are created")
+
+        created = 0
+
+        for path, directories, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith(PRECOMPRESSED_SUFFIXES + SKIPPED_EXTENSIONS):
+                    continue
+
+                full_path = os.path.join(path, filename)
+
+                if os.path.getsize(full_path) < min_size:
+                    continue
+
+                for suffix, compressor in compressors:
+                    created += self.compress(full_path, suffix, compressor, force)
+
+        self.stdout.write(f"Created {created} precompressed files in '{root}'")
@@ -0,0 +1,405 @@
+import collections
+import importlib
+import itertools
+import math
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import NoReverseMatch, reverse
+
+from wagtail import hooks
+from wagtail.models import Page
+
+from wagtail_pdf_view.mixins import PdfViewPageMixin
+
+
+def parse_weights(value):
+    """
+    Parse "model=5,page=3" into {'model': 5.0, 'page': 3.0}
+    """
+
+    weights = {}
+
+    for item in filter(None, value.split(',')):
+        name, _, weight = item.partition('=')
+        weights[name.strip()] = float(weight or 1)
+
+    return weights
+
+
+def percentile(values, p):
+    """
+    The p-th percentile of the sorted values (nearest rank)
+    """
+
+    if not values:
+        return None
+
+    index = max(0, min(len(values) - 1, math.ceil(p / 100 * len(values)) - 1))
+
+    return values[index]
+
+
+def get_process_rss(pid):
+    """
+    The RSS (in bytes) of the process and its children or None if it can't be determined
+    """
+
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            return sum(p.memory_info().rss for p in [process, *process.children(recursive=True)])
+        except psutil.Error:
+            return None
+
+    total = 0
+    pending = [pid]
+
+    try:
+        while pending:
+            pid = pending.pop()
+
+            with open(f'/proc/{pid}/statm') as f:
+                total += int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+            for task in os.listdir(f'/proc/{pid}/task'):
+                with open(f'/proc/{pid}/task/{task}/children') as f:
+                    pending += [int(child) for child in f.read().split()]
+    except (OSError, ValueError):
+        return total or None
+
+    return total
+
+
+class MemorySampler(threading.Thread):
+    """
+    Sample the RSS of the server process (and its workers) in the background
+    """
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            rss = get_process_rss(self.pid)
+
+            if rss is not None:
+                self.samples.append(rss)
+
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class Command(BaseCommand):
+    """
+    Drive the pdf endpoints of a running server with concurrent requests
+
+    The endpoints are discovered from the database (pdf views registered with 'register_pdf_site_urls',
+    live pdf pages and their draft previews) or given explicitly. Requests are drawn from the groups
+    according to their weight, i.e. the number of distinct documents controls the cache hit ratio.
+    """
+
+    help = "Load-test the pdf endpoints of a locally running server"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--base-url",
+            default="http://127.0.0.1:8000",
+            help="The root url of the running server",
+        )
+        parser.add_argument(
+            "--url",
+            action="append",
+            default=[],
+            dest="urls",
+            help="Additional path requested in the group 'url', may be given multiple times",
+        )
+        parser.add_argument(
+            "--mix",
+            default="model=5,page=3,preview=1,url=1",
+            help="Weights of the endpoint groups (model, page, preview, url), e.g. 'model=5,page=1'",
+        )
+        parser.add_argument(
+            "--objects",
+            type=int,
+            default=10,
+            help="Number of distinct documents per group",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Number of concurrent clients",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Total number of requests (ignored if --duration is given)",
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            help="Run for this many seconds instead of a fixed number of requests",
+        )
+        parser.add_argument(
+            "--user",
+            help="Username of an admin user, required for the preview endpoints",
+        )
+        parser.add_argument(
+            "--pid",
+            type=int,
+            help="Process id of the server (e.g. the gunicorn master), whose memory is sampled",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=120,
+            help="Timeout of a single request in seconds",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            help="Seed of the random request mix",
+        )
+
+    def get_model_paths(self, limit):
+        paths = []
+
+        for fn in hooks.get_hooks('register_pdf_site_urls'):
+            for pattern in fn() or []:
+                model = getattr(pattern.callback, 'view_initkwargs', {}).get(
+                    'model', getattr(getattr(pattern.callback, 'view_class', None), 'model', None)
+                )
+
+                if model is None or not pattern.name:
+                    continue
+
+                for pk in model._default_manager.values_list('pk', flat=True)[:limit]:
+                    try:
+                        paths.append(reverse(f"wagtail_pdf_view:{pattern.name}", kwargs={'pk': pk}))
+                    except NoReverseMatch:
+                        break
+
+        return paths
+
+    def get_pdf_pages(self, limit):
+        models = [
+            model for model in apps.get_models()
+            if issubclass(model, Page) and issubclass(model, PdfViewPageMixin)
+        ]
+
+        pages = []
+
+        for model in models:
+            pages += model.objects.all()[:limit]
+
+        return pages
+
+    def get_page_paths(self, limit):
+        paths = []
+
+        for page in self.get_pdf_pages(limit):
+            if not page.live:
+                continue
+
+            try:
+                url = page.url_pdf
+            except AttributeError:
+                continue
+
+            # the urls of pages are absolute if there are multiple sites, the base url is used instead
+            url = urllib.parse.urlsplit(url)
+            paths.append(urllib.parse.urlunsplit(('', '', url.path, url.query, '')))
+
+        return paths
+
+    def get_preview_paths(self, limit):
+        return [
+            reverse('wagtailadmin_pages:view_draft', args=[page.pk]) + "?mode=pdf"
+            for page in self.get_pdf_pages(limit)
+        ]
+
+    def make_session(self, username):
+        """
+        Create a session for the user in the session store of the server, which is deleted after the run
+        """
+
+        engine = importlib.import_module(settings.SESSION_ENGINE)
+
+        user = get_user_model()._default_manager.get_by_natural_key(username)
+
+        session = engine.SessionStore()
+        session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+
+        return session
+
+    def request(self, opener, group, url, cookie, timeout):
+        request = urllib.request.Request(url)
+
+        if cookie and group == 'preview':
+            request.add_header('Cookie', cookie)
+
+        start = time.perf_counter()
+
+        try:
+            with opener.open(request, timeout=timeout) as response:
+                size = len(response.read())
+                status = response.status
+        except urllib.error.HTTPError as e:
+            size, status = 0, e.code
+        except (urllib.error.URLError, OSError) as e:
+            size, status = 0, type(e).__name__
+
+        return group, url, status, size, time.perf_counter() - start
+
+    def handle(self, *args, base_url, urls, mix, objects, concurrency, requests, duration, user, pid,
+               timeout, seed, **options):
+
+        random.seed(seed)
+
+        weights = parse_weights(mix)
+
+        groups = {
+            'model': self.get_model_paths(objects) if weights.get('model') else [],
+            'page': self.get_page_paths(objects) if weights.get('page') else [],
+            'preview': self.get_preview_paths(objects) if weights.get('preview') and user else [],
+            'url': urls,
+        }
+
+        if weights.get('preview') and not user:
+            self.stderr.write("The preview endpoints require --user, they are skipped")
+
+        groups = {name: paths for name, paths in groups.items() if paths and weights.get(name)}
+
+        if not groups:
+            raise CommandError("No endpoints found, check --mix or pass paths with --url")
+
+        for name, paths in groups.items():
+            self.stdout.write(f"{name}: {len(paths)} endpoints (weight {weights[name]:g})")
+
+        session = self.make_session(user) if user and 'preview' in groups else None
+        cookie = session and f"{settings.SESSION_COOKIE_NAME}={session.session_key}"
+
+        try:
+            self.run_load(groups, weights, base_url, cookie, concurrency, requests, duration, pid, timeout)
+        finally:
+            if session is not None:
+                session.delete()
+
+    def run_load(self, groups, weights, base_url, cookie, concurrency, requests, duration, pid, timeout):
+        names = list(groups)
+        group_weights = [weights[name] for name in names]
+
+        def next_request():
+            name = random.choices(names, group_weights)[0]
+            return name, base_url.rstrip('/') + random.choice(groups[name])
+
+        # redirects (e.g. to stored documents) are followed, cookies set by the server are ignored
+        opener = urllib.request.build_opener()
+
+        sampler = MemorySampler(pid) if pid else None
+
+        if sampler:
+            sampler.start()
+
+        results = []
+        deadline = duration and time.monotonic() + duration
+        counter = itertools.count()
+
+        def client():
+            while True:
+                if deadline:
+                    if time.monotonic() >= deadline:
+                        return
+                elif next(counter) >= requests:
+                    return
+
+                group, url = next_request()
+                results.append(self.request(opener, group, url, cookie, timeout))
+
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for future in [executor.submit(client) for i in range(concurrency)]:
+                future.result()
+
+        elapsed = time.perf_counter() - start
+
+        if sampler:
+            sampler.stop()
+
+        self.report(results, elapsed, sampler)
+
+    def format_latencies(self, latencies):
+        latencies = sorted(latencies)
+
+        return "  ".join(
+            f"{label} {percentile(latencies, p) * 1000:.0f}ms"
+            for label, p in (("p50", 50), ("p90", 90), ("p99", 99), ("max", 100))
+        )
+
+    def report(self, results, elapsed, sampler):
+        if not results:
+            self.stdout.write("No requests were made")
+            return
+
+        errors = [result for result in results if not isinstance(result[2], int) or result[2] >= 400]
+
+        self.stdout.write("")
+        self.stdout.write(f"Requests:   {len(results)} in {elapsed:.1f}s ({len(results) / elapsed:.2f} req/s)")
+        self.stdout.write(f"Errors:     {len(errors)} ({len(errors) / len(results):.1%})")
+        self.stdout.write(f"Latency:    {self.format_latencies(result[4] for result in results)}")
+
+        by_group = collections.defaultdict(list)
+
+        for result in results:
+            by_group[result[0]].append(result)
+
+        for group, group_results in sorted(by_group.items()):
+            self.stdout.write(
+                f"  {group:<9} {len(group_results):>6} requests  "
+                f"{self.format_latencies(result[4] for result in group_results)}"
+            )
+
+        statuses = collections.Counter(result[2] for result in results)
+
+        self.stdout.write("Statuses:   " + ", ".join(f"{status}: {count}" for status, count in sorted(
+            statuses.items(), key=lambda item: str(item[0])
+        )))
+
+        if sampler and sampler.samples:
+            mib = 1024 * 1024
+
+            self.stdout.write(
+                f"Memory:     start {sampler.samples[0] / mib:.0f} MiB, peak {max(sampler.samples) / mib:.0f} MiB, "
+                f"end {sampler.samples[-1] / mib:.0f} MiB"
+            )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from wagtail_pdf_view.warmup import warmup
+
+
+class Command(BaseCommand):
+    """
+    Run the warmup of all pdf views (see WAGTAIL_PDF_WARMUP) and print its report
+
+    The warmup only pays off in the process which serves the requests, use the command to check
+    that all views can be warmed up and to measure the startup costs of a worker.
+    """
+
+    help = "Preload the templates and stylesheets of all pdf views and print the timing"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--no-render",
+            action="store_true",
+            help="Don't render a tiny document per view class",
+        )
+
+    def handle(self, *args, no_render=False, **options):
+        report = warmup(**({'render': False} if no_render else {}))
+
+        for view in report['views']:
+            status = f"failed: {view['error']!r}" if view['error'] else ('rendered' if view['rendered'] else 'loaded')
+
+            self.stdout.write(f"{view['view']}: {view['duration']:.3f}s ({status})")
+
+        self.stdout.write(f"Warmed up {len(report['views'])} views in {report['duration']:.3f}s")
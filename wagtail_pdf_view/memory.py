@@ -0,0 +1,335 @@
+from django.conf import settings
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+import logging
+import multiprocessing
+import os
+import threading
+
+from .concurrency import get_render_workers
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+"""
+Keep the memory of the rendering workers in check, True uses the defaults, a dict can be used to change them.
+The resident memory (RSS) is tracked after each render and logged above the threshold.
+"""
+WAGTAIL_PDF_MEMORY_GUARD = getattr(settings, 'WAGTAIL_PDF_MEMORY_GUARD', False)
+
+WAGTAIL_PDF_MEMORY_GUARD_DEFAULTS = {
+    # run the layouts in child processes (weasyprint only), which are recycled
+    'processes': False,
+    # number of child processes, defaults to the number of render workers
+    'max_processes': None,
+    # child processes are replaced after this many renders
+    'max_jobs': 100,
+    # child processes are replaced once their RSS exceeds this many bytes,
+    # without child processes a warning is logged instead
+    'max_rss': None,
+}
+
+
+def get_memory_guard_options():
+    """
+    The memory guard options or None if WAGTAIL_PDF_MEMORY_GUARD is disabled
+    """
+
+    if not WAGTAIL_PDF_MEMORY_GUARD:
+        return None
+
+    options = dict(WAGTAIL_PDF_MEMORY_GUARD_DEFAULTS)
+
+    if isinstance(WAGTAIL_PDF_MEMORY_GUARD, dict):
+        options.update(WAGTAIL_PDF_MEMORY_GUARD)
+
+    return options
+
+
+def get_rss():
+    """
+    The current resident memory of this process in bytes or None if it can't be determined
+    """
+
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    try:
+        import psutil
+    except ImportError:
+        return None
+
+    return psutil.Process().memory_info().rss
+
+
+def get_peak_rss():
+    """
+    The peak resident memory of this process in bytes or None if it can't be determined
+    """
+
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # bytes on macOS, kilobytes elsewhere
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+class MemoryStats:
+    """
+    The memory footprint of the rendering workers (this process and its render processes)
+    """
+
+    def __init__(self):
+        self.renders = 0
+        self.processes = {}
+
+        self._lock = threading.Lock()
+
+    def record(self, pid, rss, peak_rss):
+        with self._lock:
+            if pid == os.getpid():
+                self.renders += 1
+
+            stats = self.processes.setdefault(pid, {'rss': None, 'peak_rss': None, 'jobs': 0})
+
+            stats['rss'] = rss
+            stats['peak_rss'] = max(filter(None, [stats['peak_rss'], peak_rss, rss]), default=None)
+            stats['jobs'] += 1
+
+    def forget(self, pids):
+        with self._lock:
+            for pid in pids:
+                self.processes.pop(pid, None)
+
+    def as_dict(self):
+        """
+        Current and peak RSS (in bytes) of this process and the live render processes
+        """
+
+        with self._lock:
+            processes = {pid: dict(stats) for pid, stats in self.processes.items() if pid != os.getpid()}
+
+        rss = get_rss()
+
+        return {
+            'pid': os.getpid(),
+            'rss': rss,
+            'peak_rss': max(filter(None, [get_peak_rss(), rss]), default=None),
+            'renders': self.renders,
+            'processes': processes,
+            'total_rss': sum(filter(None, [rss, *(stats['rss'] for stats in processes.values())])),
+        }
+
+
+memory_stats = MemoryStats()
+
+
+def get_render_memory():
+    """
+    The memory footprint of the rendering workers of this process, see MemoryStats.as_dict()
+    """
+
+    return memory_stats.as_dict()
+
+
+def track_render_memory(label=None):
+    """
+    Record the RSS of this process after a render, which is logged if it exceeds max_rss
+    """
+
+    options = get_memory_guard_options()
+
+    if options is None:
+        return
+
+    rss = get_rss()
+
+    memory_stats.record(os.getpid(), rss, get_peak_rss())
+
+    logger.debug(f"RSS after rendering {label or 'a document'}: {rss} bytes")
+
+    if options['max_rss'] and rss and rss > options['max_rss']:
+        logger.warning(
+            f"The RSS of the rendering process exceeds the memory ceiling ({rss} > {options['max_rss']} bytes), "
+            f"consider rendering in child processes (WAGTAIL_PDF_MEMORY_GUARD['processes'])"
+        )
+
+
+def _render_isolated(response_class, kwargs, source):
+    # runs in the child process
+    response = response_class(None, None, **kwargs)
+
+    content = response.render_pdf(source)
+
+    return content, os.getpid(), get_rss(), get_peak_rss()
+
+
+class RenderProcess:
+    """
+    A single render process of the pool (an executor with one worker), which is recycled individually
+    """
+
+    def __init__(self):
+        self.executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        )
+
+        self.jobs = 0
+        self.running = 0
+        self.pid = None
+
+        # retired processes don't get new renders and are shut down after their running renders
+        self.retired = False
+
+
+class RecyclingRenderPool:
+    """
+    A pool of render processes, each of which is replaced after max_jobs renders or once it exceeds max_rss
+
+    Every process has its own executor, i.e. processes are replaced one by one and the others keep rendering.
+    A replaced process doesn't get new renders and is shut down once its running renders are finished,
+    i.e. the memory of its fragmented heap is returned to the system.
+
+    (ProcessPoolExecutor(max_tasks_per_child=...) of python 3.11+ isn't used, as its pools can deadlock
+    once more renders are queued than processes are available.)
+    """
+
+    def __init__(self, max_processes, max_jobs=None, max_rss=None):
+        self.max_processes = max_processes
+        self.max_jobs = max_jobs
+        self.max_rss = max_rss
+
+        self.processes = []
+
+        self._lock = threading.Lock()
+
+    def _retire(self, process):
+        """
+        Take the process out of the pool (with the lock held), returns whether it can be shut down already
+        """
+
+        if process.retired:
+            return False
+
+        process.retired = True
+        self.processes.remove(process)
+
+        return not process.running
+
+    def _submit(self, *args):
+        """
+        Submit the render to the least busy process, which can't be shut down in the meantime
+        """
+
+        with self._lock:
+            if len(self.processes) < self.max_processes and all(process.running for process in self.processes):
+                self.processes.append(RenderProcess())
+
+            process = min(self.processes, key=lambda process: process.running)
+
+            process.jobs += 1
+            process.running += 1
+
+            future = process.executor.submit(_render_isolated, *args)
+
+            # the process renders its last job, further renders go to a new process
+            if self.max_jobs and process.jobs >= self.max_jobs:
+                self._retire(process)
+                logger.info(f"Recycling a render process ({process.jobs} renders)")
+
+            return process, future
+
+    def _finish(self, process):
+        """
+        Account the finished render, a retired process is shut down after its last render
+        """
+
+        with self._lock:
+            process.running -= 1
+
+            idle = process.retired and not process.running
+
+        if idle:
+            process.executor.shutdown(wait=False)
+            memory_stats.forget([process.pid])
+
+    def recycle(self, process, reason):
+        """
+        Replace the process (unless it is already replaced)
+        """
+
+        with self._lock:
+            if process.retired:
+                return
+
+            idle = self._retire(process)
+
+        logger.info(f"Recycling a render process ({reason})")
+
+        if idle:
+            process.executor.shutdown(wait=False)
+            memory_stats.forget([process.pid])
+
+    def render(self, response_class, kwargs, source):
+        process, future = self._submit(response_class, kwargs, source)
+
+        try:
+            try:
+                content, pid, rss, peak_rss = future.result()
+            except BrokenProcessPool:
+                self.recycle(process, "it terminated abruptly")
+                raise
+
+            process.pid = pid
+
+            memory_stats.record(pid, rss, peak_rss)
+
+            if self.max_rss and rss and rss > self.max_rss:
+                self.recycle(process, f"RSS of process {pid} is {rss} bytes")
+        finally:
+            self._finish(process)
+
+        return content
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_render_pool():
+    """
+    The recycling process pool for renders or None if the renders run in the rendering process
+    """
+
+    global _pool
+
+    options = get_memory_guard_options()
+
+    if not options or not options['processes']:
+        return None
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = RecyclingRenderPool(
+                max_processes=options['max_processes'] or get_render_workers(),
+                max_jobs=options['max_jobs'],
+                max_rss=options['max_rss'],
+            )
+
+    return _pool
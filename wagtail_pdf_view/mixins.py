@@ -2,6 +2,7 @@
 from wagtail.contrib.routable_page.models import RoutablePageMixin, route
 
 from django.conf import settings
+from django.http import HttpResponse
 from django.shortcuts import redirect
 from django.utils.translation import gettext as _
 from django.utils.cache import add_never_cache_headers
@@ -10,28 +11,40 @@ from django.utils.text import slugify
 from django.urls.exceptions import NoReverseMatch
 
 import logging
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 
 from wagtail.models import Page, PreviewableMixin
 
+from .cache import get_cached_pdf, is_cache_enabled, set_cached_pdf
+from .chunks import copy_with, split_stream_value
+from .preview import (
+    PRERENDER_TOKEN_PARAMETER, WAGTAIL_PDF_PREVIEW_PRERENDER, WAGTAIL_PDF_PREVIEW_PRERENDER_TIMEOUT, PreviewSuperseded,
+    preview_render, start_prerender, take_prerender,
+)
 from .utils import route_function, get_pdf_viewer_url
 
-from .views import WagtailWeasyView
+from .views import AsyncWagtailWeasyView, WagtailWeasyView
 
 logger = logging.getLogger(__name__)
 
 
-def redirect_request_to_pdf_viewer(original_request):
+def redirect_request_to_pdf_viewer(original_request, token=None):
     """
     Redirect the original request to a custom pdf viewer frontend
     
     This is used to hook in pdf.js from server-side in the preview to enable propper iframe interaction.
     Using the browsers pdf viewer within iframes instead may break the preview (e.g. firefox wagtail >4.0),
     as the pdf viewer is hosted locally and thus prevents accessing scroll properites (CORS prohibited).
+
+    The token of a prerendered preview (see WAGTAIL_PDF_PREVIEW_PRERENDER) is passed on to the viewer.
     """
     
     query = original_request.GET.copy()
     # this prevents a preview redirection loop
     query['enforce_preview'] = "true"
+
+    if token:
+        query[PRERENDER_TOKEN_PARAMETER] = token
     
     path = f"{original_request.path_info}?{query.urlencode()}"
     url = get_pdf_viewer_url(path)
@@ -93,6 +106,39 @@ class MultiplePreviewMixin:
         return super().serve_preview(request, mode_name)
 
 
+class RouteUrl:
+    """
+    The url of a routed view of a page, which is computed on first access and then cached on the instance
+
+    Computing the url requires a site root lookup, which would be wasted on the many
+    pages (in querysets, menus, search results, ...) whose view urls are never used.
+    """
+
+    def __init__(self, attr, name):
+        self.attr = attr
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+
+        url = instance.url if self.name else None
+
+        # like unset attributes, if the route is disabled or the page is not routable
+        if url is None:
+            raise AttributeError(f"'{type(instance).__name__}' object has no attribute '{self.attr}'")
+
+        if not url.endswith('/'):
+            url += '/'
+
+        url += instance.reverse_subpage(self.name)
+
+        # the instance attribute takes precedence over this (non-data) descriptor from now on
+        instance.__dict__[self.attr] = url
+
+        return url
+
+
 class MultipleViewPageMixin(RoutablePageMixin):
     """
     This mixin enables multiple different views on a wagtail page.
@@ -127,6 +173,8 @@ class MultipleViewPageMixin(RoutablePageMixin):
         ("pdf", r'^$'),    # new default route
         ("html", None),    # ignored route
     ]
+    
+    The url of each view is available as attribute, e.g. `page.url_pdf`, which is computed on first access.
     """
     
     def __init_subclass__(cls):
@@ -152,36 +200,15 @@ class MultipleViewPageMixin(RoutablePageMixin):
                     # add the @route decorator to the serve methods
                     fn = getattr(cls, serve_method)
                     setattr(cls, serve_method, route_function(fn, value, *args))
-    
-    
-    def __init__(self, *args, **kwargs):
-        """
-        Assign a custom url attribute for each view during initialization
-        
-        For example the url for the 'pdf'-view of the Page will be `Page.url_pdf`
-        """
-        
-        super().__init__(*args, **kwargs)
-        
-        for key, value, *route_args in self.ROUTE_CONFIG:
-            
-            if not route_args:
-                route_args = [key]
-            
-            # Assign the url attribute to the matching reverse if the attribute is not set already
-            if value and not hasattr(self, "url_"+key):
-                
-                name = route_args[0]
-                
-                url = self.url
-                
-                if url is not None:
-                    if not url.endswith('/'):
-                        url += '/'
-                    
-                    setattr(self, "url_"+key, url+self.reverse_subpage(name))
 
+                # Provide the url of each view as lazy attribute, e.g. `Page.url_pdf`,
+                # unless the attribute is already implemented otherwise
+                attr = "url_"+key
 
+                if not hasattr(cls, attr) or isinstance(getattr(cls, attr, None), RouteUrl):
+                    setattr(cls, attr, RouteUrl(attr, args[0] if value else None))
+    
+    
 class BasePdfMixin:
     """
     A mixin for serving a wagtail objects as '.pdf'
@@ -191,10 +218,37 @@ class BasePdfMixin:
     ATTACHMENT_VARIABLE = "attachment"
     
     pdf_view_class = WagtailWeasyView
+
+    # view class used by aserve_pdf() (e.g. AsyncWagtailTexView for LaTeX)
+    async_pdf_view_class = AsyncWagtailWeasyView
     
     # Slugifies the document title if enabled
     pdf_slugify_document_name = True
 
+    # Related objects fetched together with the object for rendering, e.g. ["items"]
+    # (these lookups avoid a query per row in the template)
+    pdf_select_related = None
+    pdf_prefetch_related = None
+
+    # Serve the previous document for at most this many seconds after a change, while the
+    # current one is rendered in the background (requires WAGTAIL_PDF_CACHE)
+    pdf_stale_while_revalidate = None
+
+    # Maximal expected size of the rendered pdf in bytes, larger documents are logged as warning
+    pdf_size_budget = None
+
+    # Fill POSTed forms into the blank document (laid out once and cached) instead of rendering
+    # the submitted values (requires pikepdf and WAGTAIL_PDF_CACHE)
+    pdf_form_fill = False
+
+    # Lay out large documents in chunks in parallel processes (weasyprint only), e.g. the StreamField
+    # pdf_chunk_field = "content" is split before every block type of pdf_chunk_break = ["chapter"]
+    pdf_chunk_field = None
+    pdf_chunk_break = None
+
+    # Number the pages of the chunks continuously, which requires a second layout of the chunks
+    pdf_chunk_page_offsets = True
+
     def get_pdf_view_kwargs(self):
         """
         Specifies the keyword arguments for the pdf view class construction
@@ -205,8 +259,44 @@ class BasePdfMixin:
         if hasattr(self, 'pdf_options'):
             kwargs['pdf_options'] = self.pdf_options
 
+        if hasattr(self, 'pdf_linearize'):
+            kwargs['pdf_linearize'] = self.pdf_linearize
+
+        if hasattr(self, 'pdf_optimize'):
+            kwargs['pdf_optimize'] = self.pdf_optimize
+
         return kwargs
 
+    def get_pdf_chunks(self, request):
+        """
+        The chunks of the document or None, each chunk is a copy of this object with a part of its content
+
+        By default the pdf_chunk_field is split before the blocks in pdf_chunk_break.
+        This can be overridden to chunk other data, e.g. the rows of a table.
+        """
+
+        if not self.pdf_chunk_field or not self.pdf_chunk_break:
+            return None
+
+        value = getattr(self, self.pdf_chunk_field)
+
+        return [
+            copy_with(self, **{self.pdf_chunk_field: chunk})
+            for chunk in split_stream_value(value, self.pdf_chunk_break)
+        ]
+
+    def get_pdf_fingerprint(self, request):
+        """
+        The fingerprint of the current document for the request, i.e. the template is rendered but not laid out
+
+        The request is required, as the document may depend on it (e.g. on the base url of the site).
+        """
+
+        view = self.pdf_view_class(**self.get_pdf_view_kwargs())
+        view.setup(request, object=self, mode="pdf")
+
+        return view.get_current_pdf_fingerprint()
+
     @property
     def pdf_view(self):
         """
@@ -215,6 +305,14 @@ class BasePdfMixin:
 
         return self.pdf_view_class.as_view(**self.get_pdf_view_kwargs())
 
+    @property
+    def async_pdf_view(self):
+        """
+        Serve an async pdf view for a given instance
+        """
+
+        return self.async_pdf_view_class.as_view(**self.get_pdf_view_kwargs())
+
     def serve_pdf(self, request, **kwargs):
         """
             Serve the page as pdf using the classes pdf view
@@ -227,6 +325,17 @@ class BasePdfMixin:
 
         return response
 
+    async def aserve_pdf(self, request, **kwargs):
+        """
+            Serve the object as pdf from an async context (e.g. an async view under ASGI)
+        """
+
+        response = await self.async_pdf_view(request, object=self, mode="pdf", **kwargs)
+
+        add_never_cache_headers(response)
+
+        return response
+
 
 class BasePreviewablePdfMixin(BasePdfMixin, MultiplePreviewMixin):
     """
@@ -271,12 +380,54 @@ class BasePreviewablePdfMixin(BasePdfMixin, MultiplePreviewMixin):
         view_class = self.preview_pdf_view_class or self.pdf_view_class
         return view_class.as_view(**self.get_preview_pdf_view_kwargs(True))
     
-    def make_in_preview_panel_request(self, original_request):
+    def make_in_preview_panel_request(self, original_request, extra_request_attrs=None):
         """
         Handle in preview panel requests by redirecting to a pdf viewer like "pdf.js"
+
+        The preview is rendered in the background meanwhile (see WAGTAIL_PDF_PREVIEW_PRERENDER).
+        The dummy request of the prerender is handled in a render thread, after the admin request has finished.
         """
-        
-        return redirect_request_to_pdf_viewer(original_request)
+
+        token = None
+
+        if WAGTAIL_PDF_PREVIEW_PRERENDER:
+            # the regular preview request, as if it was sent by the viewer
+            token = start_prerender(
+                original_request.user,
+                super().make_preview_request,
+                original_request=original_request,
+                preview_mode='pdf',
+                extra_request_attrs={**(extra_request_attrs or {}), 'original_request': original_request, 'pdf_prerender': True},
+            )
+
+        return redirect_request_to_pdf_viewer(original_request, token=token)
+
+    def take_preview_render(self, original_request):
+        """
+        The prerendered preview response for the token of the request or None
+        """
+
+        token = original_request.GET.get(PRERENDER_TOKEN_PARAMETER)
+        future = token and take_prerender(token, original_request.user)
+
+        if not future:
+            return None
+
+        try:
+            response = future.result(timeout=WAGTAIL_PDF_PREVIEW_PRERENDER_TIMEOUT)
+        except FuturesTimeoutError:
+            # the preview is rendered again, which supersedes the prerender (see WAGTAIL_PDF_PREVIEW_SUPERSEDE)
+            future.cancel()
+            return None
+        except Exception:
+            # logged by the render executor, the preview is rendered again
+            return None
+
+        # e.g. the prerender gave up, as another preview of the user was rendered (PreviewBusy)
+        if response.status_code != 200:
+            return None
+
+        return response
     
     def make_preview_request(self, original_request=None, preview_mode=None, extra_request_attrs=None):
         """
@@ -290,6 +441,13 @@ class BasePreviewablePdfMixin(BasePdfMixin, MultiplePreviewMixin):
         
         if not extra_request_attrs:
             extra_request_attrs = {}
+
+        # the viewer fetches a preview, which is rendered already
+        if preview_mode == 'pdf' and original_request is not None:
+            response = self.take_preview_render(original_request)
+
+            if response is not None:
+                return response
             
         extra_request_attrs["original_request"] = original_request
         
@@ -300,7 +458,7 @@ class BasePreviewablePdfMixin(BasePdfMixin, MultiplePreviewMixin):
                 
                 try:
                     # Wagtail >4.0 fix for e.g. firefox (internal pdf viewer prohibits CORS)
-                    return self.make_in_preview_panel_request(original_request)
+                    return self.make_in_preview_panel_request(original_request, extra_request_attrs)
                 except NoReverseMatch as e:
                     logger.warn(f"Could not create an 'in preview panel' request. Falling back to regular PDF serving.")
         
@@ -312,14 +470,28 @@ class BasePreviewablePdfMixin(BasePdfMixin, MultiplePreviewMixin):
         Serve the page preview as pdf using the classes pdf view
 
         If the preview is opened outside of the preview panel, the usual pdf view is used instead.
+
+        A newer preview of the same object by the same user cancels this render (see WAGTAIL_PDF_PREVIEW_SUPERSEDE),
+        the superseded request is answered with 409 Conflict.
         """
 
         if request.original_request and not request.original_request.GET.get('in_preview_panel'):
             view = self.preview_pdf_view
         else:
             view = self.preview_panel_pdf_view
-        
-        response = view(request, object=self, mode="pdf", **kwargs)
+
+        user = getattr(request.original_request, 'user', None) or getattr(request, 'user', None)
+
+        # prerenders run in the shared render executor, whose threads must not wait for other previews
+        blocking = not getattr(request, 'pdf_prerender', False)
+
+        try:
+            with preview_render(user, self, blocking=blocking) as ticket:
+                request.pdf_preview_ticket = ticket
+
+                response = view(request, object=self, mode="pdf", **kwargs)
+        except PreviewSuperseded:
+            response = HttpResponse(_("The preview was superseded by a newer preview"), status=409)
         
         # TODO remove
         add_never_cache_headers(response)
@@ -376,6 +548,75 @@ class PdfViewPageMixin(BasePreviewablePdfMixin, MultipleViewPageMixin):
         ("html", None),
     ]
 
+    def __init_subclass__(cls):
+        """
+            Add the versioned pdf route, i.e. the pdf route followed by 'v/<fingerprint>/'
+        """
+
+        super().__init_subclass__()
+
+        if issubclass(cls, Page):
+            pattern = next((value for key, value, *args in cls.ROUTE_CONFIG if key == "pdf" and value), None)
+
+            if pattern:
+                pattern = pattern.rstrip('$')
+
+                if pattern.lstrip('^') and not pattern.endswith('/'):
+                    pattern += '/'
+
+                # the undecorated method, as the routes of the parent class are replaced
+                fn = getattr(cls.serve_pdf_versioned, '__wrapped__', cls.serve_pdf_versioned)
+
+                cls.serve_pdf_versioned = route_function(fn, pattern + r'v/(?P<pdf_version>[0-9a-f]+)/$', 'pdf_versioned')
+
+    def get_pdf_version(self, request):
+        """
+        The version of the current document for the request, i.e. its fingerprint
+
+        Computing the version renders the template of the page, so it is remembered (with WAGTAIL_PDF_CACHE)
+        until the page is published again. A version, which is outdated nevertheless
+        (e.g. after a snippet changed), is redirected to the current one.
+        """
+
+        user = getattr(request, 'user', None)
+
+        key = (
+            self._meta.label_lower, str(self.pk), str(self.live_revision_id),
+            request.scheme, request.get_host(), str(getattr(user, 'pk', None)),
+        )
+
+        version = get_cached_pdf('version', *key)
+
+        if version is None:
+            version = self.get_pdf_fingerprint(request)
+            set_cached_pdf('version', version, *key)
+
+        return version
+
+    def get_pdf_versioned_url(self, request):
+        """
+        The url of the current document, which changes with its content (i.e. it can be cached forever)
+
+        In templates use `{% pdf_versioned_url page %}`.
+        Without WAGTAIL_PDF_CACHE the version can't be remembered, i.e. every url would render the template of the page,
+        so the url of the pdf view (without version) is returned instead.
+        """
+
+        url = self.get_url(request)
+
+        if url is None:
+            return None
+
+        if not url.endswith('/'):
+            url += '/'
+
+        if not is_cache_enabled():
+            name = next((args[0] if args else key for key, value, *args in self.ROUTE_CONFIG if key == "pdf" and value))
+
+            return url + self.reverse_subpage(name)
+
+        return url + self.reverse_subpage('pdf_versioned', kwargs={'pdf_version': self.get_pdf_version(request)})
+
 
     def get_pdf_filename(self, request, **kwargs):
         """
@@ -429,3 +670,12 @@ class PdfViewPageMixin(BasePreviewablePdfMixin, MultipleViewPageMixin):
 
     def serve_html(self, request, **kwargs):
         return super().serve(request)
+
+    def serve_pdf_versioned(self, request, pdf_version, **kwargs):
+        """
+            Serve the requested version of the pdf, which is cached as immutable
+
+            Only the current version is served, outdated versions are redirected to the current one.
+        """
+
+        return self.pdf_view(request, object=self, mode="pdf", pdf_version=pdf_version, **kwargs)
@@ -0,0 +1,556 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+import contextlib
+import hashlib
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+"""
+Linearize ("fast web view") the PDF documents, which allows viewers like pdf.js to display the
+first page before the whole document is loaded. Requires pikepdf.
+"""
+WAGTAIL_PDF_LINEARIZE = getattr(settings, 'WAGTAIL_PDF_LINEARIZE', False)
+
+"""
+Optimize the size of the PDF documents after rendering. True enables all optimizations,
+a dict can be used to enable single steps, e.g. {'deduplicate_images': False}. Requires pikepdf.
+"""
+WAGTAIL_PDF_OPTIMIZE = getattr(settings, 'WAGTAIL_PDF_OPTIMIZE', False)
+
+"""
+The query parameter, which selects the pages of the served document, e.g. `?pages=1,3-5` (None disables the selection).
+Requires pikepdf.
+"""
+WAGTAIL_PDF_PAGES_PARAMETER = getattr(settings, 'WAGTAIL_PDF_PAGES_PARAMETER', 'pages')
+
+WAGTAIL_PDF_OPTIMIZE_DEFAULTS = {
+    # share identical images between all occurrences
+    'deduplicate_images': True,
+    # pack objects into compressed object streams
+    'object_streams': True,
+    # compress uncompressed streams and recompress flate streams at the highest level
+    'recompress_streams': True,
+}
+
+"""
+Size related weasyprint options used during optimization (weasyprint >= 61),
+options given by the pdf options of the view take precedence
+
+Weasyprint subsets the fonts and drops their hinting already by default (`full_fonts` and `hinting` are False).
+"""
+WEASYPRINT_OPTIMIZE_OPTIONS = {
+    # losslessly optimize the embedded images
+    'optimize_images': True,
+}
+
+
+def get_optimize_options(optimize):
+    """
+    The optimization steps for the value of WAGTAIL_PDF_OPTIMIZE (resp. pdf_optimize)
+    """
+
+    if not optimize:
+        return None
+
+    if isinstance(optimize, dict):
+        return {**WAGTAIL_PDF_OPTIMIZE_DEFAULTS, **optimize}
+
+    return dict(WAGTAIL_PDF_OPTIMIZE_DEFAULTS)
+
+
+def import_pikepdf():
+    """
+    Import the optional dependency pikepdf, which is required for the post-processing of PDFs
+    """
+
+    try:
+        import pikepdf
+    except ImportError as e:
+        raise ImproperlyConfigured(
+            "The post-processing of PDF documents requires pikepdf, install it with 'pip install wagtail-pdf-view[pikepdf]'"
+        ) from e
+
+    return pikepdf
+
+
+def linearize_pdf(content):
+    """
+    Rewrite the document linearized
+    """
+
+    pikepdf = import_pikepdf()
+
+    output = io.BytesIO()
+
+    with pikepdf.open(io.BytesIO(content)) as pdf:
+        pdf.save(output, linearize=True)
+
+    return output.getvalue()
+
+
+def get_stream_key(stream):
+    """
+    Key which is equal for streams with the same data and dictionary
+    """
+
+    digest = hashlib.sha256(stream.read_raw_bytes())
+
+    for key, value in sorted(stream.items()):
+        if key == '/Length':
+            continue
+
+        # soft masks are separate streams, which are equal for equal images
+        if key in ('/SMask', '/Mask') and hasattr(value, 'read_raw_bytes'):
+            value = get_stream_key(value)
+
+        digest.update(f"{key}={value!r};".encode())
+
+    return digest.hexdigest()
+
+
+def deduplicate_pdf_images(pdf):
+    """
+    Reference identical image streams only once
+
+    Returns the number of replaced image references.
+    """
+
+    canonical = {}
+    visited = set()
+    replaced = 0
+
+    def visit(resources):
+        nonlocal replaced
+
+        xobjects = resources.get('/XObject')
+
+        if xobjects is None:
+            return
+
+        for name in list(xobjects.keys()):
+            xobject = xobjects[name]
+
+            if not xobject.is_indirect or xobject.objgen in visited:
+                continue
+
+            subtype = xobject.get('/Subtype')
+
+            if subtype == '/Image':
+                image = canonical.setdefault(get_stream_key(xobject), xobject)
+
+                if image.objgen != xobject.objgen:
+                    xobjects[name] = image
+                    replaced += 1
+                    continue
+
+            visited.add(xobject.objgen)
+
+            if subtype == '/Form' and '/Resources' in xobject:
+                visit(xobject.Resources)
+
+    for page in pdf.pages:
+        if '/Resources' in page.obj:
+            visit(page.obj.Resources)
+
+    return replaced
+
+
+def optimize_pdf(content, deduplicate_images=True, object_streams=True, recompress_streams=True, linearize=False):
+    """
+    Reduce the size of the document
+
+    The document is rewritten once with all enabled optimizations and (optionally) linearized.
+    """
+
+    pikepdf = import_pikepdf()
+
+    output = io.BytesIO()
+
+    with pikepdf.open(io.BytesIO(content)) as pdf:
+        if deduplicate_images:
+            replaced = deduplicate_pdf_images(pdf)
+            logger.debug(f"Replaced {replaced} duplicate images")
+
+        pdf.remove_unreferenced_resources()
+
+        pdf.save(
+            output,
+            linearize=linearize,
+            compress_streams=recompress_streams,
+            recompress_flate=recompress_streams,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate if object_streams else pikepdf.ObjectStreamMode.preserve,
+        )
+
+    return output.getvalue()
+
+
+def copy_outline_items(pikepdf, items, pages):
+    """
+    Copy outline items of another document, pages maps its page objects to the pages of the new document
+    """
+
+    for item in items:
+        destination = item.destination
+        action = item.action
+
+        # explicit destinations ([page /XYZ left top zoom]) are moved to the new page
+        if action is not None and '/D' in action:
+            destination, action = action.D, None
+
+        if isinstance(destination, pikepdf.Array) and len(destination) and destination[0].objgen in pages:
+            destination = pikepdf.Array([pages[destination[0].objgen], *destination[1:]])
+        elif not isinstance(destination, (pikepdf.Name, pikepdf.String)):
+            destination = None
+
+        copy = pikepdf.OutlineItem(item.title, destination)
+        copy.is_closed = item.is_closed
+        copy.children.extend(copy_outline_items(pikepdf, item.children, pages))
+
+        yield copy
+
+
+def merge_pdfs(contents):
+    """
+    Concatenate the documents, including their bookmarks, links and form fields
+
+    The document information (e.g. the title) is taken from the first document.
+    """
+
+    pikepdf = import_pikepdf()
+
+    output = io.BytesIO()
+
+    # the stream data of copied pages is read from the documents when saving
+    with contextlib.ExitStack() as stack:
+        merged = stack.enter_context(pikepdf.new())
+        fields = []
+
+        with merged.open_outline() as outline:
+            for index, content in enumerate(contents):
+                pdf = stack.enter_context(pikepdf.open(io.BytesIO(content)))
+
+                offset = len(merged.pages)
+
+                if hasattr(merged, 'add_pages_from'):
+                    # pikepdf >= 10 also carries the form fields and named destinations
+                    merged.add_pages_from(pdf)
+                else:
+                    merged.pages.extend(pdf.pages)
+
+                    if '/AcroForm' in pdf.Root and '/Fields' in pdf.Root.AcroForm:
+                        fields.extend(merged.copy_foreign(field) for field in pdf.Root.AcroForm.Fields)
+
+                pages = {
+                    page.obj.objgen: merged.pages[offset + i].obj
+                    for i, page in enumerate(pdf.pages)
+                }
+
+                with pdf.open_outline() as chunk_outline:
+                    outline.root.extend(copy_outline_items(pikepdf, chunk_outline.root, pages))
+
+                if index == 0:
+                    for key, value in pdf.docinfo.items():
+                        merged.docinfo[key] = merged.copy_foreign(value) if value.is_indirect else value
+
+        if fields:
+            merged.Root.AcroForm = merged.make_indirect(pikepdf.Dictionary(
+                Fields=pikepdf.Array(fields),
+                NeedAppearances=True,
+            ))
+
+        merged.save(output)
+
+    return output.getvalue()
+
+
+# field flags of the AcroForm (PDF 32000-1, 12.7.4)
+FIELD_FLAG_RADIO = 1 << 15
+FIELD_FLAG_PUSHBUTTON = 1 << 16
+FIELD_FLAG_MULTISELECT = 1 << 21
+
+
+def get_inherited(field, key):
+    """
+    The value of an inheritable field attribute (e.g. /FT), which may be set on a parent field
+    """
+
+    while field is not None:
+        if key in field:
+            return field[key]
+
+        field = field.get('/Parent')
+
+    return None
+
+
+def is_widget_of(kid, field):
+    """
+    Whether the kid is a widget of the field (instead of a child field)
+
+    Widgets have no name, but weasyprint names the widgets of radio buttons like their group.
+    """
+
+    return '/T' not in kid or ('/Parent' in kid and '/T' in field and kid.T == field.T)
+
+
+def iter_form_fields(fields, parent_name=None):
+    """
+    The terminal fields of the AcroForm as (full name, field), e.g. "address.city"
+    """
+
+    for field in fields:
+        name = str(field.T) if '/T' in field else None
+        full_name = f"{parent_name}.{name}" if parent_name and name else (name or parent_name)
+
+        kids = field.get('/Kids')
+
+        # the kids of terminal fields are their widgets
+        if kids is not None and not all(is_widget_of(kid, field) for kid in kids):
+            yield from iter_form_fields(kids, full_name)
+        else:
+            yield full_name, field
+
+
+def get_widgets(field):
+    return list(field.Kids) if '/Kids' in field else [field]
+
+
+def get_on_state(widget):
+    """
+    The name of the checked appearance state of a checkbox or radio button widget, e.g. /on
+    """
+
+    states = widget.get('/AP', {}).get('/N', {})
+
+    return next((key for key in states.keys() if key != '/Off'), None)
+
+
+def fill_pdf_form(content, values, linearize=False):
+    """
+    Write the values (lists of strings by field name) into the form fields of the document
+
+    Fields without a value keep their default, except checkboxes and radio buttons, which
+    (like in HTML forms) are only submitted if they are checked.
+    The appearance of text and choice fields is generated by the viewer (/NeedAppearances).
+    """
+
+    pikepdf = import_pikepdf()
+
+    output = io.BytesIO()
+
+    with pikepdf.open(io.BytesIO(content)) as pdf:
+        if '/AcroForm' not in pdf.Root or '/Fields' not in pdf.Root.AcroForm:
+            return content
+
+        for name, field in iter_form_fields(pdf.Root.AcroForm.Fields):
+            field_type = get_inherited(field, '/FT')
+            flags = int(get_inherited(field, '/Ff') or 0)
+            value = values.get(name)
+
+            if field_type == '/Btn':
+                if flags & FIELD_FLAG_PUSHBUTTON:
+                    continue
+
+                widgets = get_widgets(field)
+                options = [str(option) for option in field.get('/Opt', [])]
+                selected = pikepdf.Name.Off
+
+                for index, widget in enumerate(widgets):
+                    state = get_on_state(widget)
+
+                    if state is None:
+                        continue
+
+                    if flags & FIELD_FLAG_RADIO:
+                        # the export value of the radio button (weasyprint names the states by index)
+                        export = options[index] if index < len(options) else state[1:]
+                        checked = bool(value) and value[-1] == export
+                    else:
+                        checked = bool(value)
+
+                    widget.AS = pikepdf.Name(state) if checked else pikepdf.Name.Off
+
+                    if checked:
+                        selected = pikepdf.Name(state)
+
+                field.V = selected
+
+            elif value is None:
+                continue
+
+            elif field_type == '/Ch' and flags & FIELD_FLAG_MULTISELECT:
+                field.V = pikepdf.Array([pikepdf.String(item) for item in value])
+
+            elif field_type in ('/Tx', '/Ch'):
+                field.V = pikepdf.String(value[-1])
+
+                # stale appearances would take precedence in some viewers
+                for widget in get_widgets(field):
+                    if '/AP' in widget:
+                        del widget['/AP']
+
+        pdf.Root.AcroForm.NeedAppearances = True
+
+        pdf.save(output, linearize=linearize)
+
+    return output.getvalue()
+
+
+def get_destination_page(pikepdf, destination):
+    """
+    The page object of an explicit destination (e.g. [page /XYZ 0 0 0]) or None
+    """
+
+    if isinstance(destination, pikepdf.Array) and len(destination) and isinstance(destination[0], pikepdf.Dictionary):
+        return destination[0]
+
+    return None
+
+
+def is_destination_of(pikepdf, destination, objgens, names=()):
+    """
+    Whether the explicit destination refers to one of the pages or the named destination is one of the names
+    """
+
+    if isinstance(destination, (pikepdf.String, pikepdf.Name)):
+        return str(destination) in names
+
+    page = get_destination_page(pikepdf, destination)
+
+    return page is not None and page.objgen in objgens
+
+
+def refers_to(pikepdf, obj, objgens, names=()):
+    """
+    Whether the destination or the /GoTo action of a link or bookmark refers to one of the pages (or named destinations)
+    """
+
+    destination = obj.get('/Dest')
+
+    if destination is None and '/A' in obj:
+        destination = obj.A.get('/D')
+
+    return is_destination_of(pikepdf, destination, objgens, names)
+
+
+def prune_named_destinations(pikepdf, pdf, objgens):
+    """
+    Remove the named destinations referring to the pages, returns their names
+    """
+
+    def is_removed(value):
+        # the value is a destination or a dictionary with the destination as /D
+        if isinstance(value, pikepdf.Dictionary):
+            value = value.get('/D')
+
+        return is_destination_of(pikepdf, value, objgens)
+
+    removed = set()
+
+    if '/Names' in pdf.Root and '/Dests' in pdf.Root.Names:
+        tree = pikepdf.NameTree(pdf.Root.Names.Dests)
+
+        for name in [name for name, value in tree.items() if is_removed(value)]:
+            del tree[name]
+            removed.add(name)
+
+    # named destinations of PDF 1.1
+    if '/Dests' in pdf.Root:
+        for name in [name for name, value in pdf.Root.Dests.items() if is_removed(value)]:
+            del pdf.Root.Dests[name]
+            removed.add(name)
+
+    return removed
+
+
+def prune_outline_items(pikepdf, items, objgens, names=()):
+    """
+    The bookmarks without those referring to the pages (or named destinations), their children are kept
+    """
+
+    for item in items:
+        children = list(prune_outline_items(pikepdf, item.children, objgens, names))
+
+        destination = item.destination
+
+        if destination is None and item.action is not None:
+            destination = item.action.get('/D')
+
+        if is_destination_of(pikepdf, destination, objgens, names):
+            yield from children
+            continue
+
+        item.children[:] = children
+
+        yield item
+
+
+def slice_pdf(content, ranges, linearize=False):
+    """
+    Keep only the pages in ranges, i.e. (first, last) page numbers, where last may be None for the last page
+
+    Bookmarks, links, named destinations and form fields of the removed pages are dropped as well,
+    so that nothing refers to the removed pages and they are not written.
+    Returns None if none of the pages is in range.
+    """
+
+    pikepdf = import_pikepdf()
+
+    output = io.BytesIO()
+
+    with pikepdf.open(io.BytesIO(content)) as pdf:
+        count = len(pdf.pages)
+
+        keep = {
+            index
+            for first, last in ranges
+            for index in range(first - 1, min(last or count, count))
+        }
+
+        if not keep:
+            return None
+
+        if len(keep) == count:
+            return content
+
+        removed = {page.obj.objgen for index, page in enumerate(pdf.pages) if index not in keep}
+
+        for index in reversed(range(count)):
+            if index not in keep:
+                del pdf.pages[index]
+
+        names = prune_named_destinations(pikepdf, pdf, removed)
+
+        annotations = set()
+
+        for page in pdf.pages:
+            if '/Annots' not in page.obj:
+                continue
+
+            page.obj.Annots = pikepdf.Array([
+                annotation for annotation in page.obj.Annots
+                if not refers_to(pikepdf, annotation, removed, names)
+            ])
+
+            annotations.update(annotation.objgen for annotation in page.obj.Annots)
+
+        if '/AcroForm' in pdf.Root and '/Fields' in pdf.Root.AcroForm:
+            pdf.Root.AcroForm.Fields = pikepdf.Array([
+                field for field in pdf.Root.AcroForm.Fields
+                if any(
+                    widget.objgen in annotations
+                    for name, terminal in iter_form_fields([field])
+                    for widget in get_widgets(terminal)
+                )
+            ])
+
+        with pdf.open_outline() as outline:
+            outline.root[:] = list(prune_outline_items(pikepdf, outline.root, removed, names))
+
+        pdf.save(output, linearize=linearize)
+
+    return output.getvalue()
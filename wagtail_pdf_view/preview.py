@@ -0,0 +1,236 @@
+from django.conf import settings
+
+from contextlib import contextmanager
+
+import logging
+import secrets
+import threading
+import time
+
+from .concurrency import submit_render
+
+logger = logging.getLogger(__name__)
+
+
+"""
+Start rendering the in panel preview, when the preview is redirected to the pdf viewer.
+The viewer fetches the document with a one-time token, i.e. it receives the result of this render.
+
+Disabled by default: tokens are process-local, behind several workers the viewer's request
+often reaches another worker, which renders the preview a second time.
+"""
+WAGTAIL_PDF_PREVIEW_PRERENDER = getattr(settings, 'WAGTAIL_PDF_PREVIEW_PRERENDER', False)
+
+"""
+Seconds a prerendered preview waits for the viewer to fetch it,
+and the viewer waits for the prerender to finish
+"""
+WAGTAIL_PDF_PREVIEW_PRERENDER_TIMEOUT = getattr(settings, 'WAGTAIL_PDF_PREVIEW_PRERENDER_TIMEOUT', 60)
+
+# query parameter of the token
+PRERENDER_TOKEN_PARAMETER = 'pdf_preview_token'
+
+"""
+A newer preview of the same object by the same user cancels the older preview renders,
+and the preview renders of a user run one after another
+"""
+WAGTAIL_PDF_PREVIEW_SUPERSEDE = getattr(settings, 'WAGTAIL_PDF_PREVIEW_SUPERSEDE', True)
+
+
+_prerenders = {}
+_prerenders_lock = threading.Lock()
+
+
+def get_user_key(user):
+    return getattr(user, 'pk', None)
+
+
+def _prune_prerenders():
+    now = time.monotonic()
+
+    for token, (future, user_key, expires) in list(_prerenders.items()):
+        if expires < now:
+            del _prerenders[token]
+
+            # the viewer never fetched the document (e.g. the preview was closed),
+            # only drops a queued render, a started render runs to its end
+            future.cancel()
+
+
+def start_prerender(user, func, *args, **kwargs):
+    """
+    Run the render function in the background, returns the token to fetch its response (see take_prerender())
+
+    The render runs in the render executor, i.e. possibly after the request that started it has finished.
+    """
+
+    token = secrets.token_urlsafe(16)
+
+    future = submit_render(func, *args, **kwargs)
+
+    with _prerenders_lock:
+        _prune_prerenders()
+        _prerenders[token] = (future, get_user_key(user), time.monotonic() + WAGTAIL_PDF_PREVIEW_PRERENDER_TIMEOUT)
+
+    return token
+
+
+def take_prerender(token, user):
+    """
+    The future of the prerender for the token (once) or None, if the token is unknown, expired or of another user
+
+    Tokens are process-local, a request handled by another worker renders the preview again.
+    """
+
+    with _prerenders_lock:
+        _prune_prerenders()
+
+        entry = _prerenders.get(token)
+
+        if entry is None or entry[1] != get_user_key(user):
+            return None
+
+        del _prerenders[token]
+
+    return entry[0]
+
+
+class PreviewSuperseded(Exception):
+    """
+    The preview render was cancelled, as a newer preview of the object was requested
+    """
+
+
+class PreviewBusy(PreviewSuperseded):
+    """
+    The (non-blocking) preview render was given up, as another preview render of the user is running
+    """
+
+
+class PreviewTicket:
+    """
+    A preview render of an object by a user, which is superseded by the next ticket for the same object
+    """
+
+    def __init__(self, user_key, object_key, generation):
+        self.user_key = user_key
+        self.object_key = object_key
+        self.generation = generation
+
+    @property
+    def key(self):
+        return self.user_key, self.object_key
+
+    @property
+    def superseded(self):
+        return preview_renders.generations.get(self.key, self.generation) != self.generation
+
+    def check(self):
+        """
+        Raise PreviewSuperseded if a newer preview was requested
+        """
+
+        if self.superseded:
+            raise PreviewSuperseded()
+
+
+class PreviewRenders:
+    """
+    The preview renders of all users in this process
+    """
+
+    # seconds between the checks of a waiting ticket, whether it was superseded
+    poll_interval = 0.1
+
+    def __init__(self):
+        self.generations = {}
+        self.pending = {}
+        self.locks = {}
+
+        # pending tickets per user, the lock of a user is dropped with the last ticket
+        self.users = {}
+
+        self._lock = threading.Lock()
+
+    def begin(self, user_key, object_key):
+        """
+        A new ticket, which supersedes the previous tickets for the object
+        """
+
+        key = (user_key, object_key)
+
+        with self._lock:
+            generation = self.generations[key] = self.generations.get(key, 0) + 1
+            self.pending[key] = self.pending.get(key, 0) + 1
+            self.users[user_key] = self.users.get(user_key, 0) + 1
+
+            lock = self.locks.setdefault(user_key, threading.Lock())
+
+        return PreviewTicket(user_key, object_key, generation), lock
+
+    def end(self, ticket):
+        with self._lock:
+            self.pending[ticket.key] -= 1
+
+            # forget the object once all its renders finished
+            if not self.pending[ticket.key]:
+                del self.pending[ticket.key]
+                del self.generations[ticket.key]
+
+            self.users[ticket.user_key] -= 1
+
+            if not self.users[ticket.user_key]:
+                del self.users[ticket.user_key]
+                del self.locks[ticket.user_key]
+
+    def acquire(self, ticket, lock, blocking=True):
+        """
+        Wait for the lock of the user, until the ticket is superseded
+
+        Non-blocking callers (e.g. prerenders in the shared render executor) raise PreviewBusy instead of waiting.
+        """
+
+        ticket.check()
+
+        if not blocking:
+            if not lock.acquire(blocking=False):
+                raise PreviewBusy()
+            return
+
+        while not lock.acquire(timeout=self.poll_interval):
+            ticket.check()
+
+
+preview_renders = PreviewRenders()
+
+
+def get_object_key(obj):
+    return f"{obj._meta.label_lower}:{obj.pk}"
+
+
+@contextmanager
+def preview_render(user, obj, blocking=True):
+    """
+    Wait until the previous preview renders of the user are finished (or cancelled), yields the ticket of the render
+
+    Raises PreviewSuperseded if a newer preview of the object was requested in the meantime,
+    or PreviewBusy if the render would have to wait, but mustn't block.
+    """
+
+    if not WAGTAIL_PDF_PREVIEW_SUPERSEDE:
+        yield None
+        return
+
+    ticket, lock = preview_renders.begin(get_user_key(user), get_object_key(obj))
+
+    try:
+        preview_renders.acquire(ticket, lock, blocking=blocking)
+
+        try:
+            ticket.check()
+
+            yield ticket
+        finally:
+            lock.release()
+    finally:
+        preview_renders.end(ticket)
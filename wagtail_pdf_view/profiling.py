@@ -0,0 +1,245 @@
+from django.conf import settings
+
+from contextlib import contextmanager
+
+import datetime
+import logging
+import os
+import threading
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+
+"""
+Allow profiling the memory allocations of single renders with a query parameter (e.g. `?pdf_profile=1`),
+which is only respected for staff users or with DEBUG enabled.
+True uses the defaults, a dict can be used to change them.
+"""
+WAGTAIL_PDF_PROFILE = getattr(settings, 'WAGTAIL_PDF_PROFILE', False)
+
+WAGTAIL_PDF_PROFILE_DEFAULTS = {
+    # the query parameter, `report` returns the report instead of the document, any other value logs it
+    'parameter': 'pdf_profile',
+    # number of listed allocation sites
+    'top': 20,
+    # number of frames stored per allocation
+    'frames': 1,
+    # directory in which the reports are saved (in addition to the log)
+    'directory': None,
+}
+
+
+def get_profile_options():
+    """
+    The profile options or None if WAGTAIL_PDF_PROFILE is disabled
+    """
+
+    if not WAGTAIL_PDF_PROFILE:
+        return None
+
+    options = dict(WAGTAIL_PDF_PROFILE_DEFAULTS)
+
+    if isinstance(WAGTAIL_PDF_PROFILE, dict):
+        options.update(WAGTAIL_PDF_PROFILE)
+
+    return options
+
+
+# tracemalloc is process-global, i.e. profiled renders run one after another
+_profile_lock = threading.Lock()
+
+
+def format_size(size):
+    for unit in ('B', 'KiB', 'MiB'):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+        size /= 1024
+
+    return f"{size:.1f} GiB"
+
+
+class RenderProfile:
+    """
+    Trace the memory allocations of a render with tracemalloc
+
+    The render is split into (possibly nested) phases, whose allocated and peak memory is recorded.
+    The allocation sites are taken from the snapshot with the most traced memory, i.e. close to the peak.
+
+    Profiled renders of a process run one after another, as tracemalloc is process-global.
+    Allocations of other threads (e.g. concurrent renders without profile) are still traced.
+    """
+
+    def __init__(self, label, top=20, frames=1):
+        self.label = label
+        self.top = top
+        self.frames = frames
+
+        self.phases = []
+        self.peak = 0
+        self.snapshot = None
+        self.snapshot_size = 0
+
+        self._open = []
+        self._was_tracing = False
+
+    def __enter__(self):
+        _profile_lock.acquire()
+
+        self._was_tracing = tracemalloc.is_tracing()
+
+        if not self._was_tracing:
+            tracemalloc.start(self.frames)
+
+        self._start = tracemalloc.get_traced_memory()[0]
+
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+        return self
+
+    def __exit__(self, *args):
+        try:
+            self._update_peak()
+
+            if not self._was_tracing:
+                tracemalloc.stop()
+        finally:
+            _profile_lock.release()
+
+    def _update_peak(self):
+        """
+        Account the peak since the last update to all open phases
+        """
+
+        current, peak = tracemalloc.get_traced_memory()
+
+        for phase in self._open:
+            phase['peak'] = max(phase['peak'], peak - phase['start'])
+
+        self.peak = max(self.peak, peak - self._start)
+
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+        return current
+
+    @contextmanager
+    def phase(self, name):
+        current = self._update_peak()
+
+        phase = {'name': name, 'depth': len(self._open), 'start': current, 'peak': 0, 'allocated': 0}
+
+        self.phases.append(phase)
+        self._open.append(phase)
+
+        try:
+            yield phase
+        finally:
+            current = self._update_peak()
+
+            self._open.pop()
+            phase['allocated'] = current - phase['start']
+
+            if current > self.snapshot_size:
+                self.snapshot = tracemalloc.take_snapshot()
+                self.snapshot_size = current
+
+    def get_top_sites(self):
+        """
+        The allocation sites with the most memory as (traceback, size, count)
+        """
+
+        if self.snapshot is None:
+            return []
+
+        snapshot = self.snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+
+        key_type = 'traceback' if self.frames > 1 else 'lineno'
+
+        return [
+            (stat.traceback, stat.size, stat.count)
+            for stat in snapshot.statistics(key_type)[:self.top]
+        ]
+
+    def as_dict(self):
+        return {
+            'label': self.label,
+            'peak': self.peak,
+            'phases': [
+                {key: phase[key] for key in ('name', 'depth', 'allocated', 'peak')}
+                for phase in self.phases
+            ],
+            'top': [
+                # the most recent frame first
+                {'site': [f"{frame.filename}:{frame.lineno}" for frame in reversed(traceback)], 'size': size, 'count': count}
+                for traceback, size, count in self.get_top_sites()
+            ],
+        }
+
+    def format(self):
+        """
+        The report as text
+        """
+
+        report = self.as_dict()
+
+        lines = [
+            f"PDF render profile of {report['label']}",
+            f"Peak: {format_size(report['peak'])}",
+            "",
+            f"{'Phase':<24}{'Allocated':>14}{'Peak':>14}",
+        ]
+
+        for phase in report['phases']:
+            name = '  ' * phase['depth'] + phase['name']
+            lines.append(f"{name:<24}{format_size(phase['allocated']):>14}{format_size(phase['peak']):>14}")
+
+        lines += ["", f"Top {len(report['top'])} allocation sites (close to the peak):"]
+
+        for site in report['top']:
+            lines.append(f"{format_size(site['size']):>12} {site['count']:>8} blocks  {site['site'][0]}")
+            lines.extend(f"{'':>30}{frame}" for frame in site['site'][1:])
+
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def profile_phase(profile, name):
+    """
+    A phase of the profile or nothing, if the render isn't profiled
+    """
+
+    if profile is None:
+        yield None
+    else:
+        with profile.phase(name) as phase:
+            yield phase
+
+
+def save_profile_report(profile, options):
+    """
+    Log the report and save it into the profile directory (if set), returns the path of the saved report
+    """
+
+    report = profile.format()
+
+    logger.info(report)
+
+    if not options['directory']:
+        return None
+
+    os.makedirs(options['directory'], exist_ok=True)
+
+    timestamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    name = ''.join(c if c.isalnum() else '-' for c in profile.label)
+
+    path = os.path.join(options['directory'], f"{timestamp}-{name}.txt")
+
+    with open(path, 'w') as f:
+        f.write(report)
+
+    return path
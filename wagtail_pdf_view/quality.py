@@ -0,0 +1,157 @@
+from django.conf import settings
+
+import collections
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+"""
+Named render profiles, which are merged into the weasyprint options of the view.
+Clients select a profile with a query parameter, e.g. `?pdf_quality=print`.
+`skip_images` hides all images (see WagtailWeasyTemplateResponse).
+"""
+WAGTAIL_PDF_RENDER_PROFILES = getattr(settings, 'WAGTAIL_PDF_RENDER_PROFILES', {
+    'draft': {'dpi': 72, 'jpeg_quality': 40, 'optimize_images': True},
+    'screen': {'dpi': 150, 'jpeg_quality': 75, 'optimize_images': True},
+    'print': {'dpi': 300, 'jpeg_quality': 95},
+})
+
+"""
+The query parameter, which selects the render profile (None disables the selection)
+"""
+WAGTAIL_PDF_RENDER_PROFILE_PARAMETER = getattr(settings, 'WAGTAIL_PDF_RENDER_PROFILE_PARAMETER', 'pdf_quality')
+
+"""
+Lower the quality of the in panel preview of documents, whose recent renders were slower than the target latency.
+True uses the defaults, a dict can be used to change them.
+"""
+WAGTAIL_PDF_ADAPTIVE_PREVIEW = getattr(settings, 'WAGTAIL_PDF_ADAPTIVE_PREVIEW', False)
+
+WAGTAIL_PDF_ADAPTIVE_PREVIEW_DEFAULTS = {
+    # target latency of a preview render in seconds
+    'target': 2.0,
+    # number of recent renders per document, whose median is compared to the target
+    'window': 3,
+    # the options, which are applied one after another while the renders are too slow
+    'steps': [{'dpi': 50, 'jpeg_quality': 30}, {'skip_images': True}],
+    # number of documents tracked per process, the least recently rendered ones are forgotten
+    'max_documents': 1000,
+}
+
+
+def get_render_profile(name):
+    """
+    The options of the named render profile or None
+    """
+
+    return WAGTAIL_PDF_RENDER_PROFILES.get(name)
+
+
+def get_adaptive_options():
+    """
+    The adaptive preview options or None if WAGTAIL_PDF_ADAPTIVE_PREVIEW is disabled
+    """
+
+    if not WAGTAIL_PDF_ADAPTIVE_PREVIEW:
+        return None
+
+    options = dict(WAGTAIL_PDF_ADAPTIVE_PREVIEW_DEFAULTS)
+
+    if isinstance(WAGTAIL_PDF_ADAPTIVE_PREVIEW, dict):
+        options.update(WAGTAIL_PDF_ADAPTIVE_PREVIEW)
+
+    return options
+
+
+class RenderTimes:
+    """
+    The recent render times and the adaptive quality level per document (in this process)
+
+    The level is raised while the median of the recent renders exceeds the target
+    and lowered again once it is below half of the target.
+    After a change the renders of a full window are awaited.
+
+    Only the most recently rendered documents are tracked (see 'max_documents'), as e.g. unsaved
+    previews are tracked per session.
+    """
+
+    def __init__(self):
+        self.times = collections.OrderedDict()
+        self.levels = {}
+
+        self._lock = threading.Lock()
+
+    def get_level(self, key):
+        return self.levels.get(key, 0)
+
+    def forget(self, max_documents):
+        """
+        Forget the least recently rendered documents beyond max_documents
+        """
+
+        while len(self.times) > max_documents:
+            key, times = self.times.popitem(last=False)
+            self.levels.pop(key, None)
+
+    def record(self, key, duration, options):
+        with self._lock:
+            times = self.times.get(key)
+
+            if times is None:
+                times = self.times[key] = collections.deque(maxlen=options['window'])
+                self.forget(options['max_documents'])
+            else:
+                self.times.move_to_end(key)
+
+            times.append(duration)
+
+            # every level is measured with a full window of renders
+            if len(times) < times.maxlen:
+                return
+
+            median = sorted(times)[len(times) // 2]
+            level = self.levels.get(key, 0)
+
+            if median > options['target'] and level < len(options['steps']):
+                level += 1
+            elif median < options['target'] / 2 and level > 0:
+                level -= 1
+            else:
+                return
+
+            self.levels[key] = level
+
+            # the next renders are measured at the new level
+            times.clear()
+
+        logger.debug(f"Adaptive preview quality of {key}: level {level} (median {median:.2f}s)")
+
+
+render_times = RenderTimes()
+
+
+def get_adaptive_preview_options(key):
+    """
+    The options of the current adaptive quality level of the document
+    """
+
+    options = get_adaptive_options()
+
+    if options is None:
+        return {}
+
+    result = {}
+
+    for step in options['steps'][:render_times.get_level(key)]:
+        result.update(step)
+
+    return result
+
+
+def record_preview_render(key, duration):
+    options = get_adaptive_options()
+
+    if options is not None:
+        render_times.record(key, duration, options)
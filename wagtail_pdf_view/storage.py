@@ -0,0 +1,175 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.http import HttpResponse, HttpResponseRedirect
+
+import time
+import urllib.parse
+
+
+"""
+Persist the rendered PDF documents in a django storage, which are then sent by the front-end server
+(or served from the storage directly) instead of passing their content through python
+"""
+WAGTAIL_PDF_STORAGE = getattr(settings, 'WAGTAIL_PDF_STORAGE', None)
+
+WAGTAIL_PDF_STORAGE_DEFAULTS = {
+    # alias of the storage in settings.STORAGES, which must be configured (the 'default' storage is usually public)
+    'storage': 'wagtail_pdf_view',
+    # directory of the documents in the storage
+    'location': 'wagtail_pdf_view/',
+    # how the documents are served: 'x-accel-redirect', 'x-sendfile' or 'redirect' (to the storage url),
+    # i.e. by default the view still checks the access and the storage may be private
+    'sendfile': 'x-accel-redirect',
+    # internal location of the storage directory for 'x-accel-redirect'
+    'sendfile_root': None,
+    # seconds after which the 'clear_pdf_storage' command deletes a document
+    'max_age': 7 * 24 * 3600,
+}
+
+SENDFILE_MODES = ('redirect', 'x-accel-redirect', 'x-sendfile')
+
+
+def get_storage_options():
+    """
+    The storage options or None if WAGTAIL_PDF_STORAGE is disabled
+    """
+
+    if not WAGTAIL_PDF_STORAGE:
+        return None
+
+    options = dict(WAGTAIL_PDF_STORAGE_DEFAULTS)
+
+    if isinstance(WAGTAIL_PDF_STORAGE, dict):
+        options.update(WAGTAIL_PDF_STORAGE)
+
+    if options['sendfile'] not in SENDFILE_MODES:
+        raise ImproperlyConfigured(f"Unknown WAGTAIL_PDF_STORAGE sendfile '{options['sendfile']}'")
+
+    if options['sendfile'] == 'x-accel-redirect' and not options['sendfile_root']:
+        raise ImproperlyConfigured("WAGTAIL_PDF_STORAGE requires a 'sendfile_root' for 'x-accel-redirect'")
+
+    if options['storage'] not in storages.backends:
+        raise ImproperlyConfigured(
+            f"WAGTAIL_PDF_STORAGE requires the storage '{options['storage']}' in settings.STORAGES"
+        )
+
+    return options
+
+
+def get_pdf_storage():
+    return storages[get_storage_options()['storage']]
+
+
+def get_storage_name(fingerprint):
+    return f"{get_storage_options()['location']}{fingerprint}.pdf"
+
+
+def is_pdf_stored(fingerprint):
+    return get_pdf_storage().exists(get_storage_name(fingerprint))
+
+
+def read_stored_pdf(fingerprint):
+    """
+    The content of the stored document
+    """
+
+    with get_pdf_storage().open(get_storage_name(fingerprint), 'rb') as f:
+        return f.read()
+
+
+def store_pdf(fingerprint, content):
+    """
+    Save the document in the storage and return its name
+
+    Documents are named by their fingerprint, i.e. an existing file already has the same content.
+    """
+
+    storage = get_pdf_storage()
+    name = get_storage_name(fingerprint)
+
+    if storage.exists(name):
+        return name
+
+    saved = storage.save(name, ContentFile(content))
+
+    # a concurrent render stored the document in the meantime, the storage chose an alternative name
+    if saved != name:
+        storage.delete(saved)
+
+    return name
+
+
+def get_storage_url(storage, name, disposition):
+    """
+    The url of the stored document
+
+    Storages with signed urls (e.g. S3 of django-storages) are asked to set the Content-Disposition of the response.
+    """
+
+    try:
+        return storage.url(name, parameters={'ResponseContentDisposition': disposition})
+    except TypeError:
+        return storage.url(name)
+
+
+def make_storage_response(fingerprint, content_type, disposition):
+    """
+    Respond with the stored document, which is sent by the front-end server or the storage
+    """
+
+    options = get_storage_options()
+    storage = get_pdf_storage()
+    name = get_storage_name(fingerprint)
+
+    sendfile = options['sendfile']
+
+    if sendfile == 'redirect':
+        return HttpResponseRedirect(get_storage_url(storage, name, disposition))
+
+    response = HttpResponse(content_type=content_type)
+    response['Content-Disposition'] = disposition
+
+    if sendfile == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = options['sendfile_root'].rstrip('/') + '/' + urllib.parse.quote(name)
+    else:
+        response['X-Sendfile'] = storage.path(name)
+
+    return response
+
+
+def clear_stored_pdfs(max_age):
+    """
+    Delete the documents, which are older than max_age seconds, returns the number of deleted documents
+
+    Deleted documents are rendered again if required.
+    """
+
+    storage = get_pdf_storage()
+    location = get_storage_options()['location']
+
+    try:
+        directories, filenames = storage.listdir(location)
+    except FileNotFoundError:
+        return 0
+
+    deleted = 0
+
+    for filename in filenames:
+        if not filename.endswith('.pdf'):
+            continue
+
+        name = location + filename
+
+        # storages without modification times (e.g. some remote storages) are cleared completely
+        try:
+            age = time.time() - storage.get_modified_time(name).timestamp()
+        except NotImplementedError:
+            age = None
+
+        if age is None or age > max_age:
+            storage.delete(name)
+            deleted += 1
+
+    return deleted
@@ -0,0 +1,51 @@
+from django import template
+
+from wagtail.templatetags.wagtailcore_tags import IncludeBlockNode, include_block
+
+from ..fragments import render_block_cached
+
+register = template.Library()
+
+
+class CachedIncludeBlockNode(IncludeBlockNode):
+    """
+    IncludeBlockNode, which takes the output from the block cache (see WAGTAIL_PDF_BLOCK_CACHE)
+    """
+
+    def render(self, context):
+        # the output may depend on the parent or extra context
+        if self.use_parent_context or self.extra_context:
+            return super().render(context)
+
+        try:
+            value = self.block_var.resolve(context)
+        except template.VariableDoesNotExist:
+            return ""
+
+        engine = "html" if context.autoescape else "html:noescape"
+
+        return render_block_cached(value, engine, lambda: super(CachedIncludeBlockNode, self).render(context))
+
+
+@register.tag
+def include_block_cached(parser, token):
+    """
+    Like {% include_block %}, but the output of the block is cached by its value
+
+    Only blocks included with "only" (i.e. without the template context) are cached.
+    """
+
+    node = include_block(parser, token)
+
+    return CachedIncludeBlockNode(node.block_var, node.extra_context, node.use_parent_context)
+
+
+@register.simple_tag(takes_context=True)
+def pdf_versioned_url(context, page):
+    """
+    The versioned url of the pdf document of the page for the current request (see PdfViewPageMixin.get_pdf_versioned_url)
+
+    Every page renders its template to compute the version, which is remembered until it is published again.
+    """
+
+    return page.get_pdf_versioned_url(context['request'])
@@ -0,0 +1,150 @@
+import io
+import unittest
+
+from django.test import SimpleTestCase
+
+from wagtail_pdf_view.postprocess import fill_pdf_form, iter_form_fields
+
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
+
+try:
+    import weasyprint
+except (ImportError, OSError):
+    # OSError: pango is not installed
+    weasyprint = None
+
+
+FORM_HTML = """
+<form>
+    <input type="text" name="name" value="">
+    <textarea name="comment"></textarea>
+    <select name="size">
+        <option value="s">S</option>
+        <option value="m">M</option>
+    </select>
+    <select name="tags" multiple>
+        <option value="a">A</option>
+        <option value="b">B</option>
+    </select>
+    <input type="checkbox" name="agree">
+    <input type="checkbox" name="newsletter" checked>
+    <input type="radio" name="color" value="red">
+    <input type="radio" name="color" value="blue">
+</form>
+"""
+
+VALUES = {
+    'name': ['Jane'],
+    'comment': ['Hello'],
+    'size': ['m'],
+    'tags': ['a', 'b'],
+    'agree': ['on'],
+    'color': ['blue'],
+}
+
+
+def get_fields(content):
+    with pikepdf.open(io.BytesIO(content)) as pdf:
+        fields = {}
+
+        for name, field in iter_form_fields(pdf.Root.AcroForm.Fields):
+            value = field.get('/V')
+
+            if isinstance(value, pikepdf.Array):
+                value = [str(item) for item in value]
+            elif value is not None:
+                value = str(value)
+
+            kids = [str(kid.AS) for kid in field.get('/Kids', [])]
+
+            fields[name] = (value, kids or str(field.get('/AS', '')))
+
+        return fields
+
+
+@unittest.skipIf(pikepdf is None, "pikepdf is not installed")
+class FillWeasyprintFormTest(SimpleTestCase):
+    """
+    Fill the AcroForm of a document rendered by weasyprint
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        if weasyprint is None:
+            raise unittest.SkipTest("weasyprint (or pango) is not available")
+
+        cls.blank = weasyprint.HTML(string=FORM_HTML).write_pdf(pdf_forms=True)
+
+    def test_fill(self):
+        fields = get_fields(fill_pdf_form(self.blank, VALUES))
+
+        self.assertEqual(fields['name'][0], 'Jane')
+        self.assertEqual(fields['comment'][0], 'Hello')
+        self.assertEqual(fields['size'][0], 'm')
+        self.assertEqual(fields['tags'][0], ['a', 'b'])
+
+        self.assertEqual(fields['agree'], ('/on', '/on'))
+        # not submitted, i.e. unchecked
+        self.assertEqual(fields['newsletter'], ('/Off', '/Off'))
+
+        self.assertEqual(fields['color'], ('/1', ['/Off', '/1']))
+
+    def test_missing_values_keep_defaults(self):
+        fields = get_fields(fill_pdf_form(self.blank, {'agree': ['on']}))
+
+        self.assertEqual(fields['name'][0], '')
+        self.assertEqual(fields['agree'][0], '/on')
+        self.assertEqual(fields['color'], ('/Off', ['/Off', '/Off']))
+
+
+@unittest.skipIf(pikepdf is None, "pikepdf is not installed")
+class FillRadioGroupTest(SimpleTestCase):
+    """
+    Radio groups structured like weasyprint's, i.e. the widgets are named like their group
+    """
+
+    def make_form(self):
+        pdf = pikepdf.new()
+        pdf.add_blank_page()
+
+        group = pdf.make_indirect(pikepdf.Dictionary(
+            FT=pikepdf.Name.Btn,
+            Ff=(1 << 14) + (1 << 15),
+            T=pikepdf.String('color'),
+            V=pikepdf.Name.Off,
+            Kids=pikepdf.Array(),
+            Opt=pikepdf.Array([pikepdf.String('red'), pikepdf.String('blue')]),
+        ))
+
+        for index in range(2):
+            group.Kids.append(pdf.make_indirect(pikepdf.Dictionary(
+                Type=pikepdf.Name.Annot,
+                Subtype=pikepdf.Name.Widget,
+                T=pikepdf.String('color'),
+                Parent=group,
+                FT=pikepdf.Name.Btn,
+                AS=pikepdf.Name.Off,
+                AP=pikepdf.Dictionary(N=pikepdf.Dictionary({f'/{index}': pdf.make_stream(b'')})),
+            )))
+
+        pdf.Root.AcroForm = pikepdf.Dictionary(Fields=pikepdf.Array([group]), NeedAppearances=True)
+
+        output = io.BytesIO()
+        pdf.save(output)
+
+        return output.getvalue()
+
+    def test_radio_widgets_are_not_fields(self):
+        fields = get_fields(self.make_form())
+
+        self.assertEqual(list(fields), ['color'])
+
+    def test_fill_radio(self):
+        fields = get_fields(fill_pdf_form(self.make_form(), {'color': ['blue']}))
+
+        self.assertEqual(fields['color'], ('/1', ['/Off', '/1']))
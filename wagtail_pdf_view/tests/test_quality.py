@@ -0,0 +1,44 @@
+from django.test import SimpleTestCase
+
+from wagtail_pdf_view.quality import WAGTAIL_PDF_ADAPTIVE_PREVIEW_DEFAULTS, RenderTimes
+
+
+OPTIONS = {**WAGTAIL_PDF_ADAPTIVE_PREVIEW_DEFAULTS, 'target': 1.0, 'window': 1, 'max_documents': 3}
+
+
+class RenderTimesTest(SimpleTestCase):
+
+    def test_levels(self):
+        times = RenderTimes()
+
+        times.record('a', 2.0, OPTIONS)
+        self.assertEqual(times.get_level('a'), 1)
+
+        times.record('a', 2.0, OPTIONS)
+        self.assertEqual(times.get_level('a'), 2)
+
+        # the last step is kept
+        times.record('a', 2.0, OPTIONS)
+        self.assertEqual(times.get_level('a'), 2)
+
+        times.record('a', 0.1, OPTIONS)
+        self.assertEqual(times.get_level('a'), 1)
+
+    def test_max_documents(self):
+        times = RenderTimes()
+
+        for index in range(10):
+            times.record(f'session-{index}', 2.0, OPTIONS)
+
+        self.assertEqual(list(times.times), ['session-7', 'session-8', 'session-9'])
+        self.assertEqual(set(times.levels), {'session-7', 'session-8', 'session-9'})
+
+    def test_recently_rendered_are_kept(self):
+        times = RenderTimes()
+
+        for key in ('a', 'b', 'c', 'a', 'd'):
+            times.record(key, 2.0, OPTIONS)
+
+        self.assertEqual(list(times.times), ['c', 'a', 'd'])
+        self.assertEqual(times.get_level('a'), 2)
+        self.assertEqual(times.get_level('b'), 0)
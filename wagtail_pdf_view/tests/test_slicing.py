@@ -0,0 +1,99 @@
+import io
+import unittest
+
+from django.test import SimpleTestCase
+
+from wagtail_pdf_view.postprocess import slice_pdf
+from wagtail_pdf_view.utils import parse_page_ranges
+
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
+
+
+def make_document(pages=5):
+    """
+    A document with a bookmark, a named destination and a link (on the first page) per page
+    """
+
+    pdf = pikepdf.new()
+
+    for index in range(pages):
+        pdf.add_blank_page()
+
+    tree = pikepdf.NameTree.new(pdf)
+    pdf.Root.Names = pikepdf.Dictionary(Dests=tree.obj)
+
+    links = pikepdf.Array()
+
+    with pdf.open_outline() as outline:
+        for index, page in enumerate(pdf.pages):
+            tree[f'page-{index + 1}'] = pikepdf.Array([page.obj, pikepdf.Name.Fit])
+
+            outline.root.append(pikepdf.OutlineItem(f'Page {index + 1}', index))
+
+            links.append(pdf.make_indirect(pikepdf.Dictionary(
+                Type=pikepdf.Name.Annot,
+                Subtype=pikepdf.Name.Link,
+                Rect=pikepdf.Array([0, 0, 10, 10]),
+                Dest=pikepdf.String(f'page-{index + 1}'),
+            )))
+
+    pdf.pages[0].obj.Annots = links
+
+    output = io.BytesIO()
+    pdf.save(output)
+
+    return output.getvalue()
+
+
+@unittest.skipIf(pikepdf is None, "pikepdf is not installed")
+class SlicePdfTest(SimpleTestCase):
+
+    def slice(self, selection, pages=5):
+        content = slice_pdf(make_document(pages), parse_page_ranges(selection))
+
+        return content and pikepdf.open(io.BytesIO(content))
+
+    def test_pages(self):
+        with self.slice('1,3-4') as pdf:
+            self.assertEqual(len(pdf.pages), 3)
+
+    def test_open_range(self):
+        with self.slice('4-') as pdf:
+            self.assertEqual(len(pdf.pages), 2)
+
+    def test_out_of_range(self):
+        self.assertIsNone(self.slice('6-'))
+
+    def test_all_pages_are_unchanged(self):
+        content = make_document()
+
+        self.assertIs(slice_pdf(content, [(1, None)]), content)
+
+    def test_bookmarks(self):
+        with self.slice('1,3') as pdf:
+            with pdf.open_outline() as outline:
+                self.assertEqual([item.title for item in outline.root], ['Page 1', 'Page 3'])
+
+    def test_named_destinations(self):
+        with self.slice('1,3') as pdf:
+            tree = pikepdf.NameTree(pdf.Root.Names.Dests)
+
+            self.assertEqual(sorted(tree.keys()), ['page-1', 'page-3'])
+
+    def test_links(self):
+        with self.slice('1,3') as pdf:
+            destinations = [str(link.Dest) for link in pdf.pages[0].obj.Annots]
+
+            self.assertEqual(destinations, ['page-1', 'page-3'])
+
+    def test_removed_pages_are_not_written(self):
+        whole = make_document(50)
+        content = slice_pdf(whole, [(1, 1)])
+
+        with pikepdf.open(io.BytesIO(content)) as pdf:
+            pages = [obj for obj in pdf.objects if isinstance(obj, pikepdf.Dictionary) and obj.get('/Type') == '/Page']
+
+            self.assertEqual(len(pages), 1)
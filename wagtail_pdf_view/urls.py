@@ -3,26 +3,27 @@ from django.conf import settings
 from django.urls import include, path, re_path
 from django.http import HttpResponse
 from django.shortcuts import render
-from django.views.decorators.clickjacking import xframe_options_sameorigin
-from django.views.static import serve
 
 from wagtail import hooks
 from wagtail.utils.urlpatterns import decorate_urlpatterns
 
 from .utils import PDF_VIEWER
+from .viewer import serve_viewer_asset
 
 
-@xframe_options_sameorigin
-def serve_sameorigin(*args, **kwargs):
-    return serve(*args, **kwargs)
-
 app_name = 'wagtail_pdf_view'
 
 urlpatterns = []
 
+# The versioned route must precede the regular route, which would match it otherwise
+if PDF_VIEWER.get('versioned_route'):
+    urlpatterns += [
+        re_path(PDF_VIEWER['versioned_route'], serve_viewer_asset, {'document_root': PDF_VIEWER['document_root']}, name=PDF_VIEWER['name'] + '-versioned'),
+    ]
+
 if PDF_VIEWER.get('route'):
     urlpatterns += [
-        re_path(PDF_VIEWER['route'], serve_sameorigin, {'document_root': PDF_VIEWER['document_root']}, name=PDF_VIEWER['name']),
+        re_path(PDF_VIEWER['route'], serve_viewer_asset, {'document_root': PDF_VIEWER['document_root']}, name=PDF_VIEWER['name']),
     ]
 
 
@@ -1,13 +1,19 @@
 
 from django.conf import settings
-from django.urls import reverse
+from django.contrib.admin.utils import quote
+from django.core.exceptions import ImproperlyConfigured
+from django.templatetags.static import static
+from django.urls import get_script_prefix, get_urlconf, reverse
 from django.urls.exceptions import NoReverseMatch
+from django.utils.translation import get_language
 
-from functools import wraps
+from functools import lru_cache, wraps
 
+import hashlib
 import logging
 
 import os
+import re
 
 import urllib.parse
 
@@ -35,24 +41,266 @@ PDF_VIEWER = getattr(settings, 'WAGTAIL_PDF_VIEWER', {
     'args': ['web/viewer.html'],
     'query': 'file',
     'route': r'^static/pdf.js/(?P<path>.*)$',
-    'document_root': os.path.dirname(__file__) + "/static/pdf.js"
+    # content-hashed route, which is served with immutable caching headers
+    'versioned_route': r'^static/pdf.js/v/(?P<version>[0-9a-f]+)/(?P<path>.*)$',
+    'document_root': os.path.dirname(__file__) + "/static/pdf.js",
+    # cache lifetime for assets requested without version
+    'max_age': 3600,
+    # let the front-end server send the files: None, 'x-accel-redirect' or 'x-sendfile'
+    'sendfile': None,
+    # internal location of document_root for 'x-accel-redirect'
+    'sendfile_root': None,
+    # serve the viewer from STATIC_URL (i.e. by the front-end server) instead of the view
+    'static_path': None,
 })
 
 if 'document_root' in PDF_VIEWER and not os.path.exists(PDF_VIEWER['document_root']):
     logger.warn(f"The document_root '{PDF_VIEWER['document_root']}' on pdf viewer {PDF_VIEWER['name']} does not exist")
 
+if PDF_VIEWER.get('sendfile') == 'x-accel-redirect' and not PDF_VIEWER.get('sendfile_root'):
+    raise ImproperlyConfigured("WAGTAIL_PDF_VIEWER requires a 'sendfile_root' for 'x-accel-redirect'")
+
+# suffixes of precompressed files, which are created by the 'compress_pdf_viewer' command
+PRECOMPRESSED_SUFFIXES = ('.br', '.gz')
+
+# file in the document_root of a pdf viewer with its version, which is written by the 'compress_pdf_viewer' command
+PDF_VIEWER_VERSION_FILE = 'version.txt'
+
+
+def compute_pdf_viewer_version(document_root):
+    """
+    Content hash of all files below the document_root of a pdf viewer
+
+    Precompressed variants and the version file are ignored, as they do not change the content.
+    """
+
+    digest = hashlib.sha256()
+
+    for path, directories, filenames in sorted(os.walk(document_root)):
+        directories.sort()
+
+        for filename in sorted(filenames):
+            if filename.endswith(PRECOMPRESSED_SUFFIXES):
+                continue
+
+            if path == document_root and filename == PDF_VIEWER_VERSION_FILE:
+                continue
+
+            full_path = os.path.join(path, filename)
+
+            digest.update(os.path.relpath(full_path, document_root).encode())
+
+            with open(full_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+
+    return digest.hexdigest()[:12]
+
+
+@lru_cache(maxsize=None)
+def get_pdf_viewer_version(document_root):
+    """
+    The version of a pdf viewer, which is used to build immutable asset urls
+
+    The version is read from the version file (see the 'compress_pdf_viewer' command).
+    Without it, the files are hashed once per process, which takes a moment for large viewers like pdf.js.
+    """
+
+    try:
+        with open(os.path.join(document_root, PDF_VIEWER_VERSION_FILE)) as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        version = None
+
+    return version or compute_pdf_viewer_version(document_root)
+
+
 def get_pdf_viewer_url(path, viewer=None):
     if viewer is None:
         viewer = PDF_VIEWER
+
+    quoted_path = urllib.parse.quote(path)
+
+    if viewer.get('static_path'):
+        # Served by the front-end server, i.e. no django worker is involved at all
+        url = static(viewer['static_path'])
+
+        return f"{url}?{viewer['query']}={quoted_path}"
     
     url_name = viewer['app_name']+':'+viewer['name']
 
     try:
-        url = reverse(url_name, args=viewer['args'])
+        if viewer.get('versioned_route') and viewer.get('document_root'):
+            version = get_pdf_viewer_version(viewer['document_root'])
+            url = reverse(url_name + '-versioned', args=[version, *viewer['args']])
+        else:
+            url = reverse(url_name, args=viewer['args'])
     except NoReverseMatch as e:
         logger.error(f"Failed to reverse the url of the pdf viewer '{url_name}'. Make sure that you've added `include('wagtail_pdf_view.urls')` to the project `urlpatterns` or reconfigure `settings.WAGTAIL_PDF_VIEWER`")
         raise e
-    
-    quoted_path = urllib.parse.quote(path)
 
     return f"{url}?{viewer['query']}={quoted_path}"
+
+
+def parse_range_header(header, size):
+    """
+    Parse a HTTP 'Range' header for a resource of the given size
+
+    Returns a list of inclusive (start, end) byte positions or None if the header is missing or malformed
+    (i.e. it must be ignored). Ranges which can not be satisfied are dropped, an empty list thus means
+    that the request is not satisfiable.
+    """
+
+    if not header:
+        return None
+
+    unit, _, specs = header.partition('=')
+
+    if unit.strip().lower() != 'bytes' or not specs:
+        return None
+
+    ranges = []
+
+    for spec in specs.split(','):
+        start, sep, end = spec.strip().partition('-')
+
+        if not sep:
+            return None
+
+        try:
+            if not start:
+                # suffix range, e.g. "-500" are the last 500 bytes
+                length = int(end)
+                if length <= 0:
+                    continue
+                start, end = max(size - length, 0), size - 1
+            else:
+                start = int(start)
+                end = min(int(end), size - 1) if end else size - 1
+        except ValueError:
+            return None
+
+        if start > end:
+            if start < size:
+                # e.g. "bytes=500-100" is invalid
+                return None
+            continue
+
+        ranges.append((start, end))
+
+    return ranges
+
+
+def parse_page_ranges(value):
+    """
+    Parse a page selection like "1,3-5,8-" into sorted, non-overlapping (first, last) page numbers
+
+    The last page of an open range (e.g. "8-") is None. Returns None if the value is malformed.
+    """
+
+    ranges = []
+
+    for spec in value.split(','):
+        first, sep, last = spec.strip().partition('-')
+
+        try:
+            first = int(first)
+            last = (int(last) if last else None) if sep else first
+        except ValueError:
+            return None
+
+        if first < 1 or (last is not None and last < first):
+            return None
+
+        ranges.append((first, last))
+
+    ranges.sort(key=lambda item: (item[0], item[1] or float('inf')))
+
+    merged = [ranges[0]]
+
+    for first, last in ranges[1:]:
+        previous_first, previous_last = merged[-1]
+
+        if previous_last is None:
+            break
+
+        if first <= previous_last + 1:
+            merged[-1] = (previous_first, None if last is None else max(last, previous_last))
+        else:
+            merged.append((first, last))
+
+    return merged
+
+
+def format_page_ranges(ranges):
+    """
+    The inverse of parse_page_ranges(), e.g. "1,3-5,8-"
+    """
+
+    return ','.join(
+        str(first) if first == last else f"{first}-{last or ''}"
+        for first, last in ranges
+    )
+
+
+# markers for the pk argument of url templates, suitable for the path converters str/slug/path, int and uuid,
+# together with the (quoted) pks, which are accepted by all patterns matching the marker
+URL_TEMPLATE_MARKERS = (
+    ('pdfviewpk', re.compile(r'[-a-zA-Z0-9_]+')),
+    ('9081726354', re.compile(r'[0-9]+')),
+    ('0f1e2d3c-4b5a-4978-8a6b-5c4d3e2f1a0b', re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')),
+)
+
+
+@lru_cache(maxsize=None)
+def _get_url_template(viewname, urlconf, script_prefix, language):
+    for marker, accepted in URL_TEMPLATE_MARKERS:
+        try:
+            url = reverse(viewname, urlconf=urlconf, args=(marker,))
+        except NoReverseMatch:
+            continue
+
+        parts = url.split(marker)
+
+        if len(parts) == 2:
+            return (*parts, accepted)
+
+    return None
+
+
+def get_url_template(viewname):
+    """
+    The (prefix, suffix, accepted) of the url for viewname with a single pk argument or None if there is no such url
+
+    The url pattern is resolved once (per urlconf and language, e.g. of i18n_patterns),
+    so that urls of many objects can be built cheaply. Only pks, which fully match the regex accepted, may be substituted.
+    """
+
+    return _get_url_template(viewname, get_urlconf(), get_script_prefix(), get_language())
+
+
+def reverse_pk(viewname, pk):
+    """
+    Equivalent to reverse(viewname, args=(quote(pk),)) using the url template of viewname
+
+    Returns None if there is no url for viewname.
+    Pks, which the template can't be trusted with (e.g. a string pk for an int pattern), are reversed regularly.
+    Patterns with custom regexes are only validated as far as the marker (i.e. a slug, int or uuid) goes.
+    """
+
+    template = get_url_template(viewname)
+
+    if template is None:
+        return None
+
+    prefix, suffix, accepted = template
+
+    quoted = str(quote(pk))
+
+    if not accepted.fullmatch(quoted):
+        try:
+            return reverse(viewname, args=(quoted,))
+        except NoReverseMatch:
+            return None
+
+    return prefix + quoted + suffix
@@ -0,0 +1,132 @@
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.clickjacking import xframe_options_sameorigin
+from django.views.decorators.http import require_safe
+
+import mimetypes
+import os
+import posixpath
+
+from .utils import PDF_VIEWER, get_pdf_viewer_version
+
+
+# file types of pdf.js, which are not known to every mimetypes database
+VIEWER_CONTENT_TYPES = {
+    '.mjs': 'text/javascript',
+    '.ftl': 'text/plain; charset=utf-8',
+    '.bcmap': 'application/octet-stream',
+    '.pfb': 'application/octet-stream',
+    '.map': 'application/json',
+}
+
+# (encoding, file suffix) of precompressed variants in order of preference
+VIEWER_ENCODINGS = [
+    ('br', '.br'),
+    ('gzip', '.gz'),
+]
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+
+def get_accepted_encodings(request):
+    return {
+        value.split(';')[0].strip().lower()
+        for value in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')
+    }
+
+
+def get_content_type(path):
+    extension = os.path.splitext(path)[1]
+
+    if extension in VIEWER_CONTENT_TYPES:
+        return VIEWER_CONTENT_TYPES[extension]
+
+    content_type, encoding = mimetypes.guess_type(path)
+
+    return content_type or 'application/octet-stream'
+
+
+def get_precompressed_variant(request, full_path):
+    """
+    Find a precompressed variant (created by 'compress_pdf_viewer') accepted by the client
+
+    Returns a tuple (path, content encoding), the encoding is None if no variant is available.
+    """
+
+    accepted = get_accepted_encodings(request)
+
+    for encoding, suffix in VIEWER_ENCODINGS:
+        if encoding in accepted and os.path.isfile(full_path + suffix):
+            return full_path + suffix, encoding
+
+    return full_path, None
+
+
+@xframe_options_sameorigin
+@require_safe
+def serve_viewer_asset(request, path, document_root=None, version=None, viewer=None):
+    """
+    Serve a file of the bundled pdf viewer
+
+    In contrast to django.views.static.serve this view
+    - serves precompressed (brotli/gzip) variants of the files
+    - sends immutable caching headers for content-hashed (versioned) urls
+    - may hand the file over to the front-end server with X-Accel-Redirect or X-Sendfile
+    - allows the viewer to be embedded in the (same origin) preview panel
+    """
+
+    if viewer is None:
+        viewer = PDF_VIEWER
+
+    document_root = document_root or viewer['document_root']
+
+    path = posixpath.normpath(path).lstrip('/')
+    full_path = safe_join(document_root, path)
+
+    if not os.path.isfile(full_path):
+        raise Http404(f"'{path}' does not exist")
+
+    statobj = os.stat(full_path)
+    content_type = get_content_type(full_path)
+
+    # Only urls with the current version hash may be cached forever
+    immutable = version is not None and version == get_pdf_viewer_version(document_root)
+
+    if not immutable:
+        modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+
+        if modified_since is not None and int(statobj.st_mtime) <= modified_since:
+            return HttpResponseNotModified()
+
+    sendfile = viewer.get('sendfile')
+
+    if sendfile == 'x-accel-redirect':
+        # nginx serves (and compresses with gzip_static) the file from an internal location
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = viewer['sendfile_root'].rstrip('/') + '/' + path
+    elif sendfile == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+    else:
+        file_path, encoding = get_precompressed_variant(request, full_path)
+
+        response = FileResponse(open(file_path, 'rb'), content_type=content_type)
+
+        # assets are displayed or loaded by the viewer, never downloaded
+        del response['Content-Disposition']
+
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+    response['Last-Modified'] = http_date(statobj.st_mtime)
+
+    if immutable:
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=viewer.get('max_age', 0))
+
+    return response
@@ -1,120 +1,1241 @@
 
+from asgiref.sync import sync_to_async
+
+from django.db.models import prefetch_related_objects
+from django.http import Http404, HttpRequest, HttpResponse, HttpResponseRedirect, QueryDict
+from django.template.loader import select_template
 from django.template.response import TemplateResponse
 from django.views.generic.base import ContextMixin, TemplateResponseMixin, View
 from django.views.generic.detail import SingleObjectMixin, BaseDetailView
 from django.urls import path,reverse
 from django.urls.exceptions import NoReverseMatch
+from django.utils.cache import add_never_cache_headers, patch_cache_control
 from django.utils.translation import gettext as _
 from django.contrib.staticfiles.finders import find
 from django.conf import settings
-from django.core.exceptions import SuspiciousFileOperation
-from django.contrib.admin.utils import quote
+from django.core.exceptions import BadRequest, ImproperlyConfigured, SuspiciousFileOperation
 from django.contrib.auth.mixins import PermissionRequiredMixin
 
-from wagtail.admin.views import generic
-from wagtail.admin.views.generic.permissions import PermissionCheckedMixin
-from wagtail.admin.views.generic.preview import PreviewOnCreate, PreviewOnEdit
-from wagtail.admin.widgets.button import ListingButton
-from wagtail.admin.ui.components import Component, MediaContainer
-from wagtail.admin.ui.side_panels import PreviewSidePanel
-from wagtail.permission_policies import ModelPermissionPolicy
-from wagtail.models import PreviewableMixin
+from wagtail.admin.views import generic
+from wagtail.admin.views.generic.permissions import PermissionCheckedMixin
+from wagtail.admin.views.generic.preview import PreviewOnCreate, PreviewOnEdit
+from wagtail.admin.widgets.button import ListingButton
+from wagtail.admin.ui.components import Component, MediaContainer
+from wagtail.admin.ui.side_panels import PreviewSidePanel
+from wagtail.permission_policies import ModelPermissionPolicy
+from wagtail.models import PreviewableMixin
+
+import copy
+import itertools
+import logging
+import os
+import pickle
+import time
+
+from .cache import (
+    aget_cached_pdf, aget_latest_pdf, aset_cached_pdf, aset_latest_pdf, get_cached_pdf, get_fingerprint,
+    get_latest_pdf, is_cache_enabled, set_cached_pdf, set_latest_pdf,
+)
+from .concurrency import (
+    RenderUnavailable, aadmit_render, acoalesce_render, admit_render, arefresh_render, coalesce_render,
+    get_chunk_executor, refresh_render, run_render,
+)
+from .chunks import ChunkedSource, render_chunk
+from .memory import get_render_pool, track_render_memory
+from .postprocess import (
+    WAGTAIL_PDF_LINEARIZE, WAGTAIL_PDF_OPTIMIZE, WAGTAIL_PDF_PAGES_PARAMETER, WEASYPRINT_OPTIMIZE_OPTIONS,
+    fill_pdf_form, get_optimize_options, linearize_pdf, merge_pdfs, optimize_pdf, slice_pdf,
+)
+from .preview import get_object_key
+from .profiling import RenderProfile, get_profile_options, profile_phase, save_profile_report
+from .quality import (
+    WAGTAIL_PDF_RENDER_PROFILE_PARAMETER, get_adaptive_preview_options, get_render_profile, record_preview_render,
+)
+from .storage import get_storage_options, is_pdf_stored, make_storage_response, read_stored_pdf, store_pdf
+from .utils import format_page_ranges, parse_page_ranges, parse_range_header, reverse_pk
+
+logger = logging.getLogger(__name__)
+
+
+"""
+Lifetime (in seconds) of the documents served on versioned urls, which are cached as immutable
+"""
+WAGTAIL_PDF_VERSIONED_MAX_AGE = getattr(settings, 'WAGTAIL_PDF_VERSIONED_MAX_AGE', 31536000)
+
+
+class ConcreteSingleObjectMixin(SingleObjectMixin):
+    """
+    This mixin simply enables you to pass a concrete instance of a object to a DetailView
+    instead of fetching it with a Queryset.
+    
+    In the regular django dataflow this a DetailView needs to match the correct object
+    e.g. given its primary key. When the concrete object is already given (e.g. during the
+    serve process of a wagtail page) fetching the same object from the database again is
+    non-optimal. With this mixin the object may simply passed to the view call with
+    'object=..'
+    """
+    
+    def setup(self, request, *args, object=None, **kwargs):
+        self.object = object
+        
+        return super().setup(request, *args, **kwargs)
+
+    def get_object(self):
+        return self.object or super().get_object()
+    
+
+class WagtailAdapterMixin(ContextMixin):
+    """
+    Make a wagtail page or model accessible as template view.
+    
+    A wagtail page already provides a template name and context for rendering.
+    This mixin makes the page rendering information available for the use with a plain
+    django view (TemplateResponse).
+    """
+    
+    def get_template_names(self):
+        
+        # possibility to override template
+        if self.template_name:
+            return self.template_name
+        
+        if hasattr(self.object, "get_template"):
+            return self.object.get_template(self.request)
+        
+        # fallback
+        return super().get_template_names()
+    
+    def get_context_data(self, **kwargs):
+        context = self.object.get_context(self.request, **kwargs)
+        context.update(super().get_context_data(**kwargs))
+        return context
+    
+    
+class PDFDetailView(BaseDetailView):
+
+    #: pdf content-disposition attachment state
+    attachment = None
+
+    #: linearize the pdf (see WAGTAIL_PDF_LINEARIZE)
+    pdf_linearize = None
+
+    #: optimize the size of the pdf (see WAGTAIL_PDF_OPTIMIZE)
+    pdf_optimize = None
+
+    #: log a warning if the rendered pdf exceeds this size (in bytes)
+    pdf_size_budget = None
+
+    #: related objects fetched together with the object (see BasePdfMixin.pdf_select_related)
+    pdf_select_related = None
+
+    #: related objects prefetched for the object (see BasePdfMixin.pdf_prefetch_related)
+    pdf_prefetch_related = None
+
+    #: serve the previous version of a changed document for at most this many seconds, while it is rendered
+    #: in the background (see BasePdfMixin.pdf_stale_while_revalidate)
+    pdf_stale_while_revalidate = None
+
+    #: persist the documents in a storage (see WAGTAIL_PDF_STORAGE), by default enabled except for previews
+    pdf_storage = None
+
+    #: fill submitted forms into the blank document instead of rendering it again (see BasePdfMixin.pdf_form_fill)
+    pdf_form_fill = None
+
+    #: fingerprint of the stored document, set by render_pdf()
+    pdf_stored_fingerprint = None
+
+    #: the version (fingerprint) requested on a versioned url (see PdfViewPageMixin.get_pdf_versioned_url)
+    pdf_version = None
+
+    #: serve only the pages requested with WAGTAIL_PDF_PAGES_PARAMETER
+    pdf_accept_pages = True
+
+    #: the served page ranges, set by render_pdf()
+    pdf_pages = None
+
+    #: support HTTP range requests, by default enabled if rendered documents are cached (see WAGTAIL_PDF_CACHE)
+    pdf_accept_ranges = None
+
+    #: fingerprint of the rendered document, set by render_pdf()
+    pdf_fingerprint = None
+
+    #: number the pages of chunked documents continuously (see BasePdfMixin.pdf_chunk_page_offsets)
+    pdf_chunk_page_offsets = None
+
+    #: allow profiling the allocations of a render with a query parameter (see WAGTAIL_PDF_PROFILE)
+    pdf_profile = None
+
+    def get_attachment(self):
+        """
+        Spefifies the content-disposition attachment state for the pdf response
+        """
+
+        if self.attachment is None:
+            return getattr(self.object, self.object.ATTACHMENT_VARIABLE, False)
+
+        return self.attachment
+
+    def get_pdf_linearize(self):
+        if self.pdf_linearize is None:
+            return WAGTAIL_PDF_LINEARIZE
+
+        return self.pdf_linearize
+
+    def get_pdf_optimize(self):
+        """
+        The enabled optimization steps or None
+        """
+
+        if self.pdf_optimize is None:
+            return get_optimize_options(WAGTAIL_PDF_OPTIMIZE)
+
+        return get_optimize_options(self.pdf_optimize)
+
+    def get_pdf_size_budget(self):
+        if self.pdf_size_budget is None:
+            return getattr(self.object, 'pdf_size_budget', None)
+
+        return self.pdf_size_budget
+
+    def get_pdf_select_related(self, model):
+        if self.pdf_select_related is None:
+            return getattr(model, 'pdf_select_related', None) or []
+
+        return self.pdf_select_related
+
+    def get_pdf_prefetch_related(self, model):
+        if self.pdf_prefetch_related is None:
+            return getattr(model, 'pdf_prefetch_related', None) or []
+
+        return self.pdf_prefetch_related
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+
+        select_related = self.get_pdf_select_related(queryset.model)
+        prefetch_related = self.get_pdf_prefetch_related(queryset.model)
+
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+
+        return queryset
+
+    def prefetch_pdf_related(self, obj):
+        """
+        Fetch the related objects of an already loaded object (e.g. a page or a concrete object)
+
+        Relations which were already fetched with the queryset are skipped.
+        """
+
+        if obj is None or obj.pk is None:
+            return
+
+        # select_related can't be applied afterwards, the relations are prefetched instead
+        lookups = [*self.get_pdf_select_related(type(obj)), *self.get_pdf_prefetch_related(type(obj))]
+
+        if lookups:
+            prefetch_related_objects([obj], *lookups)
+
+    def get_pdf_stale_while_revalidate(self):
+        """
+        The maximal staleness (in seconds) of served documents or None
+
+        Previews are always up to date and the rendered documents need to be cached.
+        """
+
+        if getattr(self, 'preview', False) or not is_cache_enabled():
+            return None
+
+        # versioned urls are served with the requested version only
+        if self.pdf_version:
+            return None
+
+        if self.pdf_stale_while_revalidate is None:
+            return getattr(self.object, 'pdf_stale_while_revalidate', None)
+
+        return self.pdf_stale_while_revalidate
+
+    def get_pdf_latest_key(self, response):
+        """
+        Identifies the document of the object independent of its content (or None)
+        """
+
+        if getattr(self.object, 'pk', None) is None:
+            return None
+
+        variant = get_fingerprint(
+            f"{type(response).__module__}.{type(response).__qualname__}",
+            response.get_fingerprint_data(),
+            self.get_pdf_linearize(),
+            self.get_pdf_optimize(),
+        )
+
+        return (self.object._meta.label_lower, str(self.object.pk), variant)
+
+    def get_stale_fingerprint(self, latest, max_staleness):
+        """
+        The fingerprint of the latest version, if it can be served instead of the current one
+        """
+
+        if latest is None:
+            return None
+
+        if latest['stale_since'] and time.time() - latest['stale_since'] > max_staleness:
+            return None
+
+        return latest['fingerprint']
+
+    def get_pdf_storage(self):
+        """
+        Whether the documents are persisted in the storage (and sent from there)
+
+        By default previews and views with permission checks (e.g. the admin views) are not stored,
+        and with 'redirect' (i.e. anyone with the url can fetch the document) only public documents are stored.
+        """
+
+        options = get_storage_options()
+
+        if options is None:
+            return False
+
+        if self.pdf_storage is None:
+            if getattr(self, 'preview', False) or getattr(self, 'permission_required', None):
+                return False
+
+            if options['sendfile'] == 'redirect':
+                return self.get_pdf_version_public()
+
+            return True
+
+        return self.pdf_storage
+
+    def get_pdf_accept_ranges(self):
+        """
+        Whether byte ranges of the document are served
+
+        Range requests are made by pdf viewers (like pdf.js) to load large documents progressively.
+        Serving them is only reasonable if the document is not rendered for each request again.
+        """
+
+        if self.pdf_accept_ranges is None:
+            return is_cache_enabled()
+
+        return self.pdf_accept_ranges
+
+    def get_pdf_fingerprint(self, response, source):
+        """
+        Fingerprint of the document, which identifies the rendered output
+        """
+
+        return get_fingerprint(
+            f"{type(response).__module__}.{type(response).__qualname__}",
+            source,
+            response.get_fingerprint_data(),
+            self.get_pdf_linearize(),
+            self.get_pdf_optimize(),
+        )
+
+    def post_process_pdf(self, content):
+        """
+        Perform additional operations on the rendered pdf document (before it is cached)
+        """
+
+        optimize = self.get_pdf_optimize()
+
+        if optimize:
+            content = optimize_pdf(content, linearize=self.get_pdf_linearize(), **optimize)
+        elif self.get_pdf_linearize():
+            content = linearize_pdf(content)
+
+        budget = self.get_pdf_size_budget()
+
+        if budget and len(content) > budget:
+            logger.warning(
+                f"The pdf of {type(self.object).__name__} {self.object.pk} exceeds its size budget "
+                f"({len(content)} > {budget} bytes)"
+            )
+
+        return content
+
+    def get_pdf_chunks(self):
+        """
+        The chunks of the object, which are laid out in parallel, or None (see BasePdfMixin.get_pdf_chunks)
+        """
+
+        if not hasattr(self.object, 'get_pdf_chunks'):
+            return None
+
+        return self.object.get_pdf_chunks(self.request)
+
+    def get_pdf_chunk_page_offsets(self):
+        if self.pdf_chunk_page_offsets is not None:
+            return self.pdf_chunk_page_offsets
+
+        return getattr(self.object, 'pdf_chunk_page_offsets', True)
+
+    def render_pdf_source(self, response):
+        """
+        Render the source of the response
+
+        Chunked objects are rendered chunk by chunk, each chunk is available as `object` in the template
+        and its position as `pdf_chunk` (a dict with `index` and `count`).
+        """
+
+        # only responses, which are able to lay out chunks (i.e. weasyprint) are chunked
+        chunks = hasattr(response, 'render_pdf_chunk') and self.get_pdf_chunks()
+
+        if not chunks or len(chunks) < 2:
+            return response.render_source()
+
+        obj, context = self.object, response.context_data
+        source = ChunkedSource()
+
+        try:
+            for index, chunk in enumerate(chunks):
+                self.object = chunk
+
+                response.context_data = self.get_context_data(**{
+                    **self.kwargs,
+                    'object': chunk,
+                    'pdf_chunk': {'index': index, 'count': len(chunks)},
+                })
+
+                source.append(response.render_source())
+        finally:
+            self.object, response.context_data = obj, context
+
+        return source
+
+    #: layouts of chunks with corrected page offsets, before the offsets are accepted as they are
+    pdf_chunk_max_relayouts = 3
+
+    def render_chunked_pdf(self, response, source):
+        """
+        Lay out the chunks in parallel processes (see WAGTAIL_PDF_CHUNK_PROCESSES) and merge them
+
+        The page numbers of a chunk depend on the pages of all previous chunks (unless get_pdf_chunk_page_offsets() is False).
+        The offsets are predicted by the page counts of the previous render of each chunk (see WAGTAIL_PDF_CACHE),
+        only chunks with a wrong offset (e.g. after a previous chunk changed) are laid out again.
+        """
+
+        response_class = type(response)
+        kwargs = self.get_pdf_process_kwargs(response)
+
+        # the chunks are laid out one after another in this process
+        if kwargs is None:
+            kwargs = response.get_chunk_kwargs()
+            map_chunks = map
+        else:
+            map_chunks = get_chunk_executor().map
+
+        def render(indices, offsets):
+            return list(map_chunks(
+                render_chunk,
+                itertools.repeat(response_class),
+                itertools.repeat(kwargs),
+                [source[i] for i in indices],
+                offsets,
+            ))
+
+        if not self.get_pdf_chunk_page_offsets():
+            return merge_pdfs([content for content, pages in render(range(len(source)), itertools.repeat(0))])
+
+        # the page counts only predict the offsets, i.e. the key doesn't need to cover everything affecting the layout
+        keys = [get_fingerprint(chunk, kwargs) for chunk in source]
+        predicted = [get_cached_pdf('chunk-pages', key) or 0 for key in keys[:-1]]
+
+        offsets = [0, *itertools.accumulate(predicted)]
+        results = render(range(len(source)), offsets)
+
+        for attempt in range(self.pdf_chunk_max_relayouts):
+            actual = [0, *itertools.accumulate(pages for content, pages in results[:-1])]
+            stale = [i for i, (offset, expected) in enumerate(zip(offsets, actual)) if offset != expected]
+
+            if not stale:
+                break
+
+            for i, result in zip(stale, render(stale, [actual[i] for i in stale])):
+                results[i] = result
+
+            offsets = actual
+        else:
+            logger.warning(f"The page offsets of the chunks of {type(self.object).__name__} {self.object.pk} did not settle")
+
+        for key, (content, pages) in zip(keys, results):
+            set_cached_pdf('chunk-pages', pages, key)
+
+        return merge_pdfs([content for content, pages in results])
+
+    def get_pdf_process_kwargs(self, response):
+        """
+        The keyword arguments of the response for other processes (see get_chunk_kwargs()) or None
+
+        None is returned if they can't be pickled (e.g. weasyprint CSS objects in the options),
+        the document is then laid out in this process.
+        """
+
+        kwargs = response.get_chunk_kwargs()
+
+        try:
+            pickle.dumps(kwargs)
+        except Exception as e:
+            logger.warning(
+                f"The options of {type(response).__name__} can't be passed to other processes ({e!r}), "
+                f"the document is laid out in this process. Pass stylesheets as paths instead of CSS objects."
+            )
+            return None
+
+        return kwargs
+
+    def render_pdf_content(self, response, source):
+        """
+        Render the source of the response to the (post-processed) pdf document
+
+        The layout runs in this process, the chunk processes or a render process of the memory guard.
+        """
+
+        pool = get_render_pool()
+
+        if pool is not None and hasattr(response, 'get_chunk_kwargs') and not isinstance(source, ChunkedSource):
+            kwargs = self.get_pdf_process_kwargs(response)
+        else:
+            kwargs = None
+
+        if isinstance(source, ChunkedSource):
+            content = self.render_chunked_pdf(response, source)
+        elif kwargs is not None:
+            # the layout runs in a recycled child process (see WAGTAIL_PDF_MEMORY_GUARD)
+            content = pool.render(type(response), kwargs, source)
+        else:
+            content = response.render_pdf(source)
+            track_render_memory(f"{type(self.object).__name__} {self.object.pk}")
+
+        return self.post_process_pdf(content)
+
+    def render_pdf_uncached(self, response, source, fingerprint):
+        """
+        Render the pdf document (once admitted) and cache it
+        """
+
+        with admit_render():
+            self.check_pdf_superseded()
+
+            content = self.render_pdf_content(response, source)
+
+        set_cached_pdf(fingerprint, content)
+
+        if self.get_pdf_stale_while_revalidate() and (key := self.get_pdf_latest_key(response)):
+            set_latest_pdf({'fingerprint': fingerprint, 'stale_since': None}, *key)
+
+        return content
+
+    def get_pdf_preview_ticket(self):
+        """
+        The ticket of a cancellable preview render (see BasePreviewablePdfMixin.serve_preview_pdf) or None
+        """
+
+        return getattr(self.request, 'pdf_preview_ticket', None)
+
+    def check_pdf_superseded(self):
+        """
+        Raise PreviewSuperseded if a newer preview of the object was requested
+        """
+
+        ticket = self.get_pdf_preview_ticket()
+
+        if ticket is not None:
+            ticket.check()
+
+    def render_stale_pdf(self, response, source):
+        """
+        Take the previous version of the document from the cache and render the current one in the background
+
+        Returns None if there is no previous version or if it is too stale (see get_pdf_stale_while_revalidate).
+        """
+
+        max_staleness = self.get_pdf_stale_while_revalidate()
+        key = max_staleness and self.get_pdf_latest_key(response)
+
+        if not key:
+            return None
+
+        latest = get_latest_pdf(*key)
+        fingerprint = self.get_stale_fingerprint(latest, max_staleness)
+
+        content = fingerprint and get_cached_pdf(fingerprint)
+
+        if content is None:
+            return None
+
+        # the staleness is measured from the first request for the changed document
+        if not latest['stale_since']:
+            set_latest_pdf({**latest, 'stale_since': time.time()}, *key)
+
+        refresh_render(self.pdf_fingerprint, self.render_pdf_uncached, response, source, self.pdf_fingerprint)
+
+        self.pdf_fingerprint = fingerprint
+
+        return content
+
+    def get_pdf_content(self, response, source):
+        """
+        The pdf document of the response from the cache, a stale version or a new render
+        """
+
+        content = get_cached_pdf(self.pdf_fingerprint)
+
+        if content is None:
+            content = self.render_stale_pdf(response, source)
+
+        if content is None and self.get_pdf_preview_ticket() is not None:
+            # cancellable preview renders don't share their result
+            content = self.render_pdf_uncached(response, source, self.pdf_fingerprint)
+
+        if content is None:
+            content = coalesce_render(
+                self.pdf_fingerprint, self.render_pdf_uncached, response, source, self.pdf_fingerprint
+            )
+
+        return content
+
+    def get_pdf_pages(self):
+        """
+        The requested (first, last) page ranges (see WAGTAIL_PDF_PAGES_PARAMETER) or None for the whole document
+        """
+
+        if not WAGTAIL_PDF_PAGES_PARAMETER or not self.pdf_accept_pages:
+            return None
+
+        value = self.request.GET.get(WAGTAIL_PDF_PAGES_PARAMETER)
+
+        if not value:
+            return None
+
+        pages = parse_page_ranges(value)
+
+        if pages is None:
+            raise BadRequest(f"Invalid page selection '{value}'")
+
+        return pages
+
+    def get_pdf_pages_suffix(self, pages):
+        return f"pages-{format_page_ranges(pages)}"
+
+    def slice_pdf_pages(self, content, pages):
+        """
+        The requested pages of the document, raises Http404 if none of them exists
+        """
+
+        content = slice_pdf(content, pages, linearize=self.get_pdf_linearize())
+
+        if content is None:
+            raise Http404("The document has none of the requested pages")
+
+        return content
+
+    def get_pdf_pages_content(self, response, source, pages):
+        """
+        The requested pages of the document, which are cached separately for each selection
+
+        The whole document is taken from the cache or the storage or rendered first.
+        """
+
+        suffix = self.get_pdf_pages_suffix(pages)
+
+        content = get_cached_pdf(self.pdf_fingerprint, suffix)
+
+        if content is not None:
+            return content
+
+        if self.get_pdf_storage() and is_pdf_stored(self.pdf_fingerprint):
+            content = read_stored_pdf(self.pdf_fingerprint)
+        else:
+            content = self.get_pdf_content(response, source)
+
+        content = self.slice_pdf_pages(content, pages)
+
+        set_cached_pdf(self.pdf_fingerprint, content, suffix)
+
+        return content
+
+    def render_pdf(self, response):
+        """
+        Render the pdf document of the response or take it from the cache
+
+        Concurrent requests for the same document share a single render (see WAGTAIL_PDF_COALESCE_RENDERS).
+        Stored documents (see WAGTAIL_PDF_STORAGE) are not loaded at all.
+        """
+
+        source = self.render_pdf_source(response)
+
+        if self.get_pdf_preview_ticket() is not None:
+            self.check_pdf_superseded()
+
+            # weasyprint checks again between the layout and writing the pdf
+            response.pdf_checkpoint = self.check_pdf_superseded
+
+        self.pdf_fingerprint = self.get_pdf_fingerprint(response, source)
+
+        # outdated versions are redirected (see get())
+        if self.is_pdf_version_outdated():
+            return response
+
+        if pages := self.get_pdf_pages():
+            self.pdf_pages = pages
+
+            response.content = self.get_pdf_pages_content(response, source, pages)
+
+            return response
+
+        if self.get_pdf_storage():
+            if not is_pdf_stored(self.pdf_fingerprint):
+                content = self.get_pdf_content(response, source)
+                store_pdf(self.pdf_fingerprint, content)
+
+            self.pdf_stored_fingerprint = self.pdf_fingerprint
+
+            # the content is sent by the front-end server or the storage
+            response.content = b''
+
+            return response
+
+        response.content = self.get_pdf_content(response, source)
+
+        return response
+
+    def make_range_response(self, request, response):
+        """
+        Answer a HTTP range request with the requested part of the document (206)
+
+        For (wagtail) preview requests the headers of the original request are used,
+        as wagtails dummy request doesn't contain them.
+        """
+
+        headers = getattr(request, "original_request", None) or request
+        headers = headers.META
+
+        content = response.content
+        size = len(content)
+
+        response['Accept-Ranges'] = 'bytes'
+        response['Content-Length'] = size
+
+        # a range of an outdated document must not be served
+        if_range = headers.get('HTTP_IF_RANGE')
+        if if_range and if_range != response.get('ETag'):
+            return response
+
+        ranges = parse_range_header(headers.get('HTTP_RANGE'), size)
+
+        # ignored header or multiple ranges, which are answered with the full document
+        if ranges is None or len(ranges) > 1:
+            return response
+
+        if not ranges:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        start, end = ranges[0]
+
+        response.status_code = 206
+        response.content = content[start:end + 1]
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+
+        return response
+
+    def render_unavailable(self, exception):
+        """
+        The response for rejected renders (see WAGTAIL_PDF_RENDER_CONCURRENCY)
+        """
+
+        response = HttpResponse(
+            _("Too many documents are rendered at the moment, please try again later."),
+            status=503,
+            content_type="text/plain",
+        )
+
+        if exception.retry_after is not None:
+            response['Retry-After'] = int(exception.retry_after)
+
+        add_never_cache_headers(response)
+
+        return response
+    
+    def get_content_disposition(self, request, **kwargs):
+        return '{}filename="{}"'.format(
+            "attachment;" if self.get_attachment() else '',
+            self.object.get_pdf_filename(request, **kwargs)
+        )
+
+    def post_process_responce(self, request, response, **kwargs):
+        """
+        Perform additional operations on the pdf response
+        """
+
+        disposition = self.get_content_disposition(request, **kwargs)
+
+        if self.pdf_stored_fingerprint:
+            return make_storage_response(self.pdf_stored_fingerprint, response['Content-Type'], disposition)
+
+        response['Content-Disposition'] = disposition
+
+        if self.pdf_fingerprint and self.pdf_pages:
+            response['ETag'] = f'"{self.pdf_fingerprint}-{self.get_pdf_pages_suffix(self.pdf_pages)}"'
+        elif self.pdf_fingerprint:
+            response['ETag'] = f'"{self.pdf_fingerprint}"'
+
+        if self.get_pdf_accept_ranges():
+            response = self.make_range_response(request, response)
+        
+        return response
+    
+    def get_pdf_profile(self):
+        """
+        The requested profile mode ('report' or 'log') or None
+
+        Profiling is restricted to staff users, unless DEBUG is enabled.
+        """
+
+        options = get_profile_options()
+
+        if not options or self.pdf_profile is False:
+            return None
+
+        request = getattr(self.request, "original_request", None) or self.request
+        mode = request.GET.get(options['parameter'])
+
+        if not mode:
+            return None
+
+        if not settings.DEBUG and not getattr(getattr(request, 'user', None), 'is_staff', False):
+            return None
+
+        return 'report' if mode == 'report' else 'log'
+
+    def profile_pdf(self, request, mode, **kwargs):
+        """
+        Render the document uncached and in this process with tracemalloc
+
+        The report is logged (and saved, see WAGTAIL_PDF_PROFILE) or returned instead of the document.
+        """
+
+        options = get_profile_options()
+
+        profile = RenderProfile(
+            f"{type(self.object).__name__} {self.object.pk}",
+            top=options['top'],
+            frames=options['frames'],
+        )
+
+        with profile:
+            with profile.phase('context'):
+                context = self.get_context_data(**kwargs)
+                response = self.render_to_response(context)
+
+            with profile.phase('html'):
+                source = response.render_source()
+
+            # weasyprint responses report the css, layout and write phases
+            response.pdf_profile = profile
+
+            with profile.phase('pdf'):
+                response.content = self.post_process_pdf(response.render_pdf(source))
+
+        save_profile_report(profile, options)
+
+        if mode == 'report':
+            response = HttpResponse(profile.format(), content_type='text/plain; charset=utf-8')
+        else:
+            response = self.post_process_responce(request, response, **kwargs)
+
+        add_never_cache_headers(response)
+
+        return response
+
+    def is_pdf_version_outdated(self):
+        """
+        Whether the requested version isn't the current document, which is checked before the layout
+        """
+
+        return bool(self.pdf_version) and self.pdf_fingerprint != self.pdf_version
+
+    def get_pdf_version_public(self):
+        """
+        Whether shared caches (e.g. CDNs) may keep the document of a versioned url
+
+        Only anonymous requests for objects without view restrictions (e.g. wagtail page privacy) are public.
+        """
+
+        if getattr(getattr(self.request, 'user', None), 'is_authenticated', False):
+            return False
+
+        restrictions = getattr(self.object, 'get_view_restrictions', None)
+
+        return restrictions is None or not restrictions().exists()
+
+    def make_version_redirect(self, request):
+        """
+        Redirect the request for an outdated version to the url of the current one
+        """
+
+        path, _, query = request.get_full_path().partition('?')
+        head, _, tail = path.rpartition(self.pdf_version)
+
+        response = HttpResponseRedirect(head + self.pdf_fingerprint + tail + (f"?{query}" if query else ''))
+        add_never_cache_headers(response)
+
+        return response
+
+    def make_versioned_response(self, request, response):
+        """
+        Mark the response of a versioned url (see PdfViewPageMixin.get_pdf_versioned_url) as immutable
+        """
+
+        # redirects to the storage may expire
+        if response.status_code in (200, 206):
+            visibility = 'public' if self.get_pdf_version_public() else 'private'
+
+            patch_cache_control(response, max_age=WAGTAIL_PDF_VERSIONED_MAX_AGE, immutable=True, **{visibility: True})
+
+        return response
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+
+        self.prefetch_pdf_related(self.object)
+        
+        kwargs["object"] = self.object
+
+        # the fingerprint of the document in the url (see PdfViewPageMixin.get_pdf_versioned_url)
+        self.pdf_version = kwargs.pop('pdf_version', None)
+
+        if profile := self.get_pdf_profile():
+            return self.profile_pdf(request, profile, **kwargs)
+
+        if request.method == 'POST' and self.get_pdf_form_fill():
+            return self.serve_filled_pdf_form(request, **kwargs)
+        
+        # Difference to BaseDetailView: Also pass kwargs
+        context = self.get_context_data(**kwargs)
+        
+        response = self.render_to_response(context)
+
+        try:
+            response = self.render_pdf(response)
+        except RenderUnavailable as e:
+            return self.render_unavailable(e)
+
+        if self.is_pdf_version_outdated():
+            return self.make_version_redirect(request)
+        
+        response = self.post_process_responce(request, response, **kwargs)
+
+        if self.pdf_version:
+            response = self.make_versioned_response(request, response)
+
+        return response
+
+    def get_current_pdf_fingerprint(self):
+        """
+        The fingerprint of the current document of the object (the template is rendered, but not laid out)
+        """
+
+        self.object = self.get_object()
+
+        self.prefetch_pdf_related(self.object)
+
+        kwargs = {key: value for key, value in self.kwargs.items() if key != 'pdf_version'}
+
+        context = self.get_context_data(**kwargs, object=self.object)
+        response = self.render_to_response(context)
+
+        return self.get_pdf_fingerprint(response, self.render_pdf_source(response))
+    
+    def get_pdf_form_fill(self):
+        """
+        Whether submitted forms are filled into the blank document (see serve_filled_pdf_form)
+        """
+
+        if self.pdf_form_fill is None:
+            return getattr(self.object, 'pdf_form_fill', False)
+
+        return self.pdf_form_fill
+
+    def get_pdf_form_values(self, request):
+        """
+        The submitted values by field name, which are filled into the form fields of the document
+        """
+
+        return {name: values for name, values in request.POST.lists() if name != 'csrfmiddlewaretoken'}
+
+    def get_blank_pdf_form_request(self, request):
+        """
+        The request, with which the blank form is rendered, i.e. a GET request without the submitted data
+        """
+
+        blank = copy.copy(request)
+        blank.method = 'GET'
+        blank.POST = QueryDict()
+
+        return blank
+
+    def render_blank_pdf_form(self, **kwargs):
+        """
+        The response and source of the blank form, its document is cached like any other document
+        """
+
+        context = self.get_context_data(**kwargs)
+
+        response = self.render_to_response(context)
+        source = self.render_pdf_source(response)
+
+        self.pdf_fingerprint = self.get_pdf_fingerprint(response, source)
+
+        return response, source
+
+    def make_filled_pdf_form_response(self, request, response, content, **kwargs):
+        self.request = request
+
+        response.content = content
+        response['Content-Disposition'] = self.get_content_disposition(request, **kwargs)
+
+        return response
+
+    def serve_filled_pdf_form(self, request, **kwargs):
+        """
+        Fill the submitted values into the form fields of the blank document, which is only laid out once
+        """
+
+        self.request = self.get_blank_pdf_form_request(request)
+
+        response, source = self.render_blank_pdf_form(**kwargs)
+
+        try:
+            content = self.get_pdf_content(response, source)
+        except RenderUnavailable as e:
+            return self.render_unavailable(e)
+
+        content = fill_pdf_form(content, self.get_pdf_form_values(request), linearize=self.get_pdf_linearize())
+
+        return self.make_filled_pdf_form_response(request, response, content, **kwargs)
+
+    # support for post (e.g. for filling forms)
+    def post(self, request, *args, **kwargs):
+        return self.get(request, *args, **kwargs)
+
+
+class AsyncPDFDetailView(PDFDetailView):
+    """
+    PDFDetailView for ASGI deployments
+
+    The object and its context are loaded asynchronously and the layout runs in the
+    render executor (see WAGTAIL_PDF_RENDER_WORKERS), i.e. the event loop is never blocked.
+    """
+
+    async def aget_object(self):
+        """
+        Async version of SingleObjectMixin.get_object(), which respects concrete objects
+        """
+
+        if getattr(self, 'object', None) is not None:
+            return self.object
+
+        queryset = self.get_queryset()
+
+        pk = self.kwargs.get(self.pk_url_kwarg)
+        slug = self.kwargs.get(self.slug_url_kwarg)
+
+        if pk is not None:
+            queryset = queryset.filter(pk=pk)
+
+        if slug is not None and (pk is None or self.query_pk_and_slug):
+            queryset = queryset.filter(**{self.get_slug_field(): slug})
+
+        if pk is None and slug is None:
+            raise AttributeError(
+                "Generic detail view %s must be called with either an object "
+                "pk or a slug in the URLconf." % self.__class__.__name__
+            )
+
+        try:
+            return await queryset.aget()
+        except queryset.model.DoesNotExist:
+            raise Http404(
+                _("No %(verbose_name)s found matching the query")
+                % {"verbose_name": queryset.model._meta.verbose_name}
+            )
+
+    async def arender_pdf_uncached(self, response, source, fingerprint):
+        async with aadmit_render():
+            self.check_pdf_superseded()
+
+            content = await run_render(self.render_pdf_content, response, source)
+
+        await aset_cached_pdf(fingerprint, content)
+
+        if self.get_pdf_stale_while_revalidate() and (key := self.get_pdf_latest_key(response)):
+            await aset_latest_pdf({'fingerprint': fingerprint, 'stale_since': None}, *key)
+
+        return content
+
+    async def arender_stale_pdf(self, response, source):
+        max_staleness = self.get_pdf_stale_while_revalidate()
+        key = max_staleness and self.get_pdf_latest_key(response)
+
+        if not key:
+            return None
+
+        latest = await aget_latest_pdf(*key)
+        fingerprint = self.get_stale_fingerprint(latest, max_staleness)
+
+        content = fingerprint and await aget_cached_pdf(fingerprint)
+
+        if content is None:
+            return None
+
+        if not latest['stale_since']:
+            await aset_latest_pdf({**latest, 'stale_since': time.time()}, *key)
+
+        arefresh_render(self.pdf_fingerprint, self.arender_pdf_uncached, response, source, self.pdf_fingerprint)
+
+        self.pdf_fingerprint = fingerprint
+
+        return content
+
+    async def aget_pdf_content(self, response, source):
+        content = await aget_cached_pdf(self.pdf_fingerprint)
+
+        if content is None:
+            content = await self.arender_stale_pdf(response, source)
+
+        if content is None and self.get_pdf_preview_ticket() is not None:
+            content = await self.arender_pdf_uncached(response, source, self.pdf_fingerprint)
+
+        if content is None:
+            content = await acoalesce_render(
+                self.pdf_fingerprint, self.arender_pdf_uncached, response, source, self.pdf_fingerprint
+            )
+
+        return content
+
+    async def aget_pdf_pages_content(self, response, source, pages):
+        suffix = self.get_pdf_pages_suffix(pages)
+
+        content = await aget_cached_pdf(self.pdf_fingerprint, suffix)
+
+        if content is not None:
+            return content
+
+        # whether the view stores the document may depend on the database (e.g. page view restrictions)
+        stored = await sync_to_async(lambda: self.get_pdf_storage() and is_pdf_stored(self.pdf_fingerprint))()
+
+        if stored:
+            content = await sync_to_async(read_stored_pdf)(self.pdf_fingerprint)
+        else:
+            content = await self.aget_pdf_content(response, source)
+
+        content = await run_render(self.slice_pdf_pages, content, pages)
+
+        await aset_cached_pdf(self.pdf_fingerprint, content, suffix)
+
+        return content
+
+    async def arender_pdf(self, response):
+        """
+        Async version of render_pdf()
+
+        Templates may access the database, thus the source is rendered in a sync context.
+        """
+
+        source = await sync_to_async(self.render_pdf_source)(response)
+
+        self.pdf_fingerprint = self.get_pdf_fingerprint(response, source)
+
+        if self.is_pdf_version_outdated():
+            return response
+
+        if pages := self.get_pdf_pages():
+            self.pdf_pages = pages
+
+            response.content = await self.aget_pdf_pages_content(response, source, pages)
+
+            return response
+
+        if await sync_to_async(self.get_pdf_storage)():
+            if not await sync_to_async(is_pdf_stored)(self.pdf_fingerprint):
+                content = await self.aget_pdf_content(response, source)
+                await sync_to_async(store_pdf)(self.pdf_fingerprint, content)
+
+            self.pdf_stored_fingerprint = self.pdf_fingerprint
+
+            response.content = b''
+
+            return response
+
+        response.content = await self.aget_pdf_content(response, source)
+
+        return response
+
+    async def get(self, request, *args, **kwargs):
+        self.object = await self.aget_object()
 
-import weasyprint
+        await sync_to_async(self.prefetch_pdf_related)(self.object)
 
-from django_weasyprint.views import WeasyTemplateResponseMixin, WeasyTemplateResponse
+        kwargs["object"] = self.object
 
+        self.pdf_version = kwargs.pop('pdf_version', None)
 
-class ConcreteSingleObjectMixin(SingleObjectMixin):
-    """
-    This mixin simply enables you to pass a concrete instance of a object to a DetailView
-    instead of fetching it with a Queryset.
-    
-    In the regular django dataflow this a DetailView needs to match the correct object
-    e.g. given its primary key. When the concrete object is already given (e.g. during the
-    serve process of a wagtail page) fetching the same object from the database again is
-    non-optimal. With this mixin the object may simply passed to the view call with
-    'object=..'
-    """
-    
-    def setup(self, request, *args, object=None, **kwargs):
-        self.object = object
-        
-        return super().setup(request, *args, **kwargs)
+        # the staff check may load the user from the database
+        if profile := await sync_to_async(self.get_pdf_profile)():
+            return await sync_to_async(self.profile_pdf)(request, profile, **kwargs)
 
-    def get_object(self):
-        return self.object or super().get_object()
-    
+        if request.method == 'POST' and self.get_pdf_form_fill():
+            return await self.aserve_filled_pdf_form(request, **kwargs)
 
-class WagtailAdapterMixin(ContextMixin):
-    """
-    Make a wagtail page or model accessible as template view.
-    
-    A wagtail page already provides a template name and context for rendering.
-    This mixin makes the page rendering information available for the use with a plain
-    django view (TemplateResponse).
-    """
-    
-    def get_template_names(self):
-        
-        # possibility to override template
-        if self.template_name:
-            return self.template_name
-        
-        if hasattr(self.object, "get_template"):
-            return self.object.get_template(self.request)
-        
-        # fallback
-        return super().get_template_names()
-    
-    def get_context_data(self, **kwargs):
-        context = self.object.get_context(self.request, **kwargs)
-        context.update(super().get_context_data(**kwargs))
-        return context
-    
-    
-class PDFDetailView(BaseDetailView):
+        context = await sync_to_async(self.get_context_data)(**kwargs)
 
-    #: pdf content-disposition attachment state
-    attachment = None
+        # the template is loaded and the response may look up e.g. the site of the object
+        response = await sync_to_async(self.render_to_response)(context)
 
-    def get_attachment(self):
-        """
-        Spefifies the content-disposition attachment state for the pdf response
-        """
+        try:
+            response = await self.arender_pdf(response)
+        except RenderUnavailable as e:
+            return self.render_unavailable(e)
 
-        if self.attachment is None:
-            return getattr(self.object, self.object.ATTACHMENT_VARIABLE, False)
+        if self.is_pdf_version_outdated():
+            return self.make_version_redirect(request)
 
-        return self.attachment
-    
-    def post_process_responce(self, request, response, **kwargs):
-        """
-        Perform additional operations on the pdf response
-        """
+        # e.g. the filename of the object may access the database
+        response = await sync_to_async(self.post_process_responce)(request, response, **kwargs)
+
+        if self.pdf_version:
+            response = await sync_to_async(self.make_versioned_response)(request, response)
 
-        response['Content-Disposition'] = '{}filename="{}"'.format(
-            "attachment;" if self.get_attachment() else '',
-            self.object.get_pdf_filename(request, **kwargs)
-        )
-        
         return response
-    
-    def get(self, request, *args, **kwargs):
-        self.object = self.get_object()
-        
-        kwargs["object"] = self.object
-        
-        # Difference to BaseDetailView: Also pass kwargs
-        context = self.get_context_data(**kwargs)
-        
-        response = self.render_to_response(context)
-        
-        return self.post_process_responce(request, response, **kwargs)
-    
-    # support for post (e.g. for filling forms)
-    def post(self, request, *args, **kwargs):
-        return self.get(self, request, *args, **kwargs)
+
+    async def aserve_filled_pdf_form(self, request, **kwargs):
+        self.request = self.get_blank_pdf_form_request(request)
+
+        response, source = await sync_to_async(self.render_blank_pdf_form)(**kwargs)
+
+        try:
+            content = await self.aget_pdf_content(response, source)
+        except RenderUnavailable as e:
+            return self.render_unavailable(e)
+
+        content = await run_render(
+            fill_pdf_form, content, self.get_pdf_form_values(request), linearize=self.get_pdf_linearize()
+        )
+
+        return await sync_to_async(self.make_filled_pdf_form_response)(request, response, content, **kwargs)
+
+    async def post(self, request, *args, **kwargs):
+        return await self.get(request, *args, **kwargs)
 
 
 """
@@ -133,8 +1254,60 @@ WAGTAIL_PREVIEW_PANEL_PDF_OPTIONS = getattr(settings, 'WAGTAIL_PREVIEW_PANEL_PDF
 })
 
 
-class WagtailWeasyTemplateResponse(WeasyTemplateResponse):    
-    
+# options of WagtailWeasyTemplateResponse, which are not passed to weasyprint
+RESPONSE_OPTIONS = ('skip_images',)
+
+# hides the images of documents rendered with the option `skip_images`, e.g. for fast previews
+SKIP_IMAGES_CSS = """
+img, svg, object, embed, video, canvas { display: none !important }
+* { background-image: none !important }
+"""
+
+
+class WagtailWeasyTemplateResponse(TemplateResponse):
+    """
+    A TemplateResponse, which is rendered as PDF document using weasyprint
+
+    This is a reimplementation of django_weasyprint.views.WeasyTemplateResponse.
+    Weasyprint (and its cairo/pango/fontTools stack) is only imported once a document
+    is rendered, i.e. processes that never render PDFs (management commands, HTML only workers)
+    do not need to load it at all.
+
+    Rendering is split in two steps: render_source() renders the template to HTML and
+    render_pdf() lays out the HTML and writes the PDF.
+    """
+
+    #: the RenderProfile of a profiled render (see PDFDetailView.profile_pdf)
+    pdf_profile = None
+
+    #: called between the layout and writing the pdf, e.g. to cancel superseded previews
+    pdf_checkpoint = None
+
+    def __init__(self, request, template, context=None, content_type=None, status=None, charset=None,
+                 using=None, headers=None, filename=None, attachment=True, stylesheets=None, options=None,
+                 base_url=None):
+
+        self._base_url = base_url
+        self._stylesheets = stylesheets or []
+        self._options = options.copy() if options else {}
+
+        super().__init__(
+            request,
+            template,
+            context=context,
+            content_type=content_type or WagtailWeasyTemplateMixin.content_type,
+            status=status,
+            charset=charset,
+            using=using,
+            headers=headers,
+        )
+
+        if filename:
+            self['Content-Disposition'] = '{}filename="{}"'.format(
+                "attachment;" if attachment else '',
+                filename
+            )
+
     def get_base_url(self):
         """
         Determine base URL to fetch CSS files from `WEASYPRINT_BASEURL` or
@@ -144,6 +1317,9 @@ class WagtailWeasyTemplateResponse(WeasyTemplateResponse):
         working fallback for the dummy requests used by wagtails page preview mode.
         """
         
+        if self._base_url:
+            return self._base_url
+
         if hasattr(settings, 'WEASYPRINT_BASEURL'):
             return settings.WEASYPRINT_BASEURL
         
@@ -153,6 +1329,28 @@ class WagtailWeasyTemplateResponse(WeasyTemplateResponse):
             
         return self._request.build_absolute_uri('/')
 
+    def get_url_fetcher(self):
+        """
+        The url fetcher of django_weasyprint, which loads static and media files directly from disk
+        """
+
+        try:
+            from django_weasyprint.utils import DjangoURLFetcher
+        except ImportError:
+            # django_weasyprint < 2.4
+            from django_weasyprint.utils import django_url_fetcher
+            return django_url_fetcher
+
+        return DjangoURLFetcher()
+
+    def get_font_config(self):
+        """
+        A FreeType font configuration to handle @font-face rules
+        """
+
+        from weasyprint.text.fonts import FontConfiguration
+
+        return FontConfiguration()
 
     def get_css(self, base_url, url_fetcher, font_config, *args, **kwargs):
         """
@@ -166,6 +1364,8 @@ class WagtailWeasyTemplateResponse(WeasyTemplateResponse):
         for the correct static file by using django.contrib.staticfiles.finders.find(value) as fallback.
         """
         
+        import weasyprint
+
         tmp = []
         for value in self._stylesheets:
             try:
@@ -199,10 +1399,188 @@ class WagtailWeasyTemplateResponse(WeasyTemplateResponse):
             
         return tmp
 
+    def get_stylesheet_versions(self):
+        """
+        The modification time and size of the stylesheet files (or None e.g. for urls), so that edited stylesheets
+        change the fingerprint
+
+        Files referenced by the stylesheets (e.g. fonts, images, @import) are not covered.
+        """
+
+        versions = []
+
+        for value in self._stylesheets:
+            path = None
+
+            try:
+                if isinstance(value, (str, os.PathLike)):
+                    path = value if os.path.isfile(value) else find(value)
+
+                stat = os.stat(path) if path else None
+            except (OSError, SuspiciousFileOperation):
+                stat = None
+
+            versions.append(stat and (stat.st_mtime_ns, stat.st_size))
+
+        return versions
+
+    def get_fingerprint_data(self):
+        """
+        Everything besides the HTML source, which affects the rendered document
+        """
+
+        return {
+            'base_url': self.get_base_url(),
+            'stylesheets': list(self._stylesheets),
+            'stylesheet_versions': self.get_stylesheet_versions(),
+            'options': self._options,
+        }
+
+    def get_weasyprint_options(self):
+        """
+        The options passed to weasyprint, i.e. without the options handled by the response (e.g. `skip_images`)
+        """
+
+        return {key: value for key, value in self._options.items() if key not in RESPONSE_OPTIONS}
+
+    def render_source(self):
+        """
+        Render the template as HTML
+        """
+
+        return super().rendered_content
+
+    def get_document(self, source=None, stylesheets=()):
+        """
+        Returns the laid out weasyprint document for the HTML source
+
+        The additional stylesheets are applied after the stylesheets of the response.
+        """
+
+        import weasyprint
+
+        if source is None:
+            source = self.render_source()
+
+        base_url = self.get_base_url()
+        url_fetcher = self.get_url_fetcher()
+        font_config = self.get_font_config()
+
+        html = weasyprint.HTML(
+            string=source,
+            base_url=base_url,
+            url_fetcher=url_fetcher,
+        )
+
+        options = self.get_weasyprint_options()
+
+        with profile_phase(self.pdf_profile, 'css'):
+            options.setdefault('stylesheets', self.get_css(base_url, url_fetcher, font_config))
+
+        if self._options.get('skip_images'):
+            stylesheets = [weasyprint.CSS(string=SKIP_IMAGES_CSS), *stylesheets]
+
+        options['stylesheets'] = [*options['stylesheets'], *stylesheets]
+
+        with profile_phase(self.pdf_profile, 'layout'):
+            return html.render(font_config=font_config, **options)
+
+    def render_pdf(self, source):
+        """
+        Lay out the HTML source and write the PDF
+        """
+
+        document = self.get_document(source)
+
+        if self.pdf_checkpoint is not None:
+            self.pdf_checkpoint()
+
+        with profile_phase(self.pdf_profile, 'write'):
+            return document.write_pdf(**self.get_weasyprint_options())
+
+    def get_chunk_kwargs(self):
+        """
+        Keyword arguments for the construction of the response in other processes
+
+        These responses lay out chunks (see render_pdf_chunk()) or documents in the render processes
+        of the memory guard (see WAGTAIL_PDF_MEMORY_GUARD), i.e. they have no request or template.
+        """
+
+        return {
+            'base_url': self.get_base_url(),
+            'stylesheets': list(self._stylesheets),
+            'options': self._options,
+        }
+
+    def render_pdf_chunk(self, source, page_offset=0):
+        """
+        Lay out the HTML source of a chunk, whose pages are numbered from page_offset + 1
+
+        Returns the PDF and the number of pages of the chunk.
+        """
+
+        import weasyprint
+
+        stylesheets = []
+
+        if page_offset:
+            # the page counter is not incremented on pages that reset it
+            stylesheets.append(weasyprint.CSS(string=f"@page :first {{ counter-reset: page {page_offset + 1} }}"))
+
+        document = self.get_document(source, stylesheets)
+
+        return document.write_pdf(**self.get_weasyprint_options()), len(document.pages)
+
+    @property
+    def rendered_content(self):
+        """
+        Returns the rendered PDF document
+        """
+
+        return self.render_pdf(self.render_source())
+
+    def warmup(self, render=True):
+        """
+        Load the stylesheets and optionally render a tiny document
+
+        This triggers weasyprint's lazy imports, the CSS parsing and the font discovery once,
+        so that the first real request of a worker does not pay for them.
+        """
+
+        import weasyprint
+
+        base_url = getattr(settings, 'WEASYPRINT_BASEURL', None)
+        url_fetcher = self.get_url_fetcher()
+        font_config = self.get_font_config()
+
+        # the options may contain stylesheets already (see get_document())
+        options = self.get_weasyprint_options()
+        options.setdefault('stylesheets', self.get_css(base_url, url_fetcher, font_config))
+
+        if render:
+            document = weasyprint.HTML(
+                string="<p>&nbsp;</p>",
+                base_url=base_url,
+                url_fetcher=url_fetcher,
+            ).render(font_config=font_config, **options)
+
+            document.write_pdf(**self.get_weasyprint_options())
+
+
+class WagtailWeasyTemplateMixin(WagtailAdapterMixin, ConcreteSingleObjectMixin, TemplateResponseMixin):
+    """
+    Provide the weasyprint compiler as view
+
+    Like django_weasyprint.views.WeasyTemplateResponseMixin, but without importing weasyprint.
+    """
 
-class WagtailWeasyTemplateMixin(WagtailAdapterMixin, ConcreteSingleObjectMixin, WeasyTemplateResponseMixin):
     response_class = WagtailWeasyTemplateResponse
-    
+    content_type = 'application/pdf'
+
+    pdf_filename = None
+    pdf_attachment = True
+    pdf_stylesheets = []
+
     pdf_options = None
     preview_pdf_options = None
     preview_panel_pdf_options = None
@@ -210,6 +1588,9 @@ class WagtailWeasyTemplateMixin(WagtailAdapterMixin, ConcreteSingleObjectMixin,
     preview = False
     in_preview_panel = False
 
+    #: names of the selectable render profiles (see WAGTAIL_PDF_RENDER_PROFILES), None allows all, False none
+    pdf_render_profiles = None
+
 
     def get_pdf_options(self):
         """
@@ -239,22 +1620,128 @@ class WagtailWeasyTemplateMixin(WagtailAdapterMixin, ConcreteSingleObjectMixin,
         return WAGTAIL_DEFAULT_PDF_OPTIONS or {}
 
     
+    def get_pdf_render_profile(self):
+        """
+        The name of the render profile selected with the query parameter (see WAGTAIL_PDF_RENDER_PROFILE_PARAMETER) or None
+        """
+
+        if self.pdf_render_profiles is False or not WAGTAIL_PDF_RENDER_PROFILE_PARAMETER:
+            return None
+
+        name = self.request.GET.get(WAGTAIL_PDF_RENDER_PROFILE_PARAMETER)
+
+        if name is None or get_render_profile(name) is None:
+            return None
+
+        if self.pdf_render_profiles is not None and name not in self.pdf_render_profiles:
+            return None
+
+        return name
+
+    def get_pdf_filename(self):
+        return self.pdf_filename
+
     def get_pdf_stylesheets(self):
         # try to call get_stylesheets, otherwise get stylesheet attribute
         try:
             stylesheets = self.object.get_stylesheets(self.request)
         except AttributeError:
-            stylesheets = getattr(self.object, "stylesheets", [])
+            stylesheets = getattr(self.object, "stylesheets", self.pdf_stylesheets)
         
         return stylesheets
 
+    def render_to_response(self, context, **response_kwargs):
+        options = self.get_pdf_options()
+
+        # let weasyprint optimize the images, unless the options say otherwise
+        if hasattr(self, 'get_pdf_optimize') and self.get_pdf_optimize():
+            options = {**WEASYPRINT_OPTIMIZE_OPTIONS, **options}
+
+        # the options are part of the fingerprint, i.e. every profile and quality level is cached separately
+        profile = self.get_pdf_render_profile()
+
+        if profile:
+            options = {**options, **get_render_profile(profile)}
+
+        if self.in_preview_panel and (key := self.get_pdf_adaptive_key()):
+            options = {**options, **get_adaptive_preview_options(key)}
+
+        response_kwargs.update({
+            'attachment': self.pdf_attachment,
+            'filename': self.get_pdf_filename(),
+            'stylesheets': self.get_pdf_stylesheets(),
+            'options': options,
+        })
+
+        return super().render_to_response(context, **response_kwargs)
+
+    def render_pdf_content(self, response, source):
+        start = time.perf_counter()
+
+        content = super().render_pdf_content(response, source)
+
+        # the render times of the in panel preview adapt its quality (see WAGTAIL_PDF_ADAPTIVE_PREVIEW)
+        if self.in_preview_panel and (key := self.get_pdf_adaptive_key()):
+            record_preview_render(key, time.perf_counter() - start)
+
+        return content
+
+    def get_pdf_adaptive_key(self):
+        """
+        Identifies the previewed document for the adaptive preview quality (or None to skip the adaption)
+
+        Unsaved objects (e.g. in the preview of the create view) all have the pk None,
+        they are told apart by the session of the editor.
+        """
+
+        key = get_object_key(self.object)
+
+        if self.object.pk is None:
+            request = getattr(self.request, 'original_request', None) or self.request
+            session_key = getattr(getattr(request, 'session', None), 'session_key', None)
+
+            if not session_key:
+                return None
+
+            key = f"{key}:{session_key}"
+
+        return key
+
+    @classmethod
+    def warmup(cls, model, render=True, **initkwargs):
+        """
+        Preload the template and the stylesheets of this view for a model
+
+        A blank instance of the model is used as object, i.e. no database access is required.
+        """
+
+        view = cls(**initkwargs)
+        view.setup(HttpRequest(), object=model())
+
+        template_names = view.get_template_names()
+        select_template([template_names] if isinstance(template_names, str) else template_names)
+
+        response = view.response_class(
+            request=view.request,
+            template=template_names,
+            stylesheets=view.get_pdf_stylesheets(),
+            options=view.get_pdf_options(),
+        )
+
+        response.warmup(render=render)
+
 
 class WagtailWeasyView(WagtailWeasyTemplateMixin, PDFDetailView):
     pass
+
+
+class AsyncWagtailWeasyView(WagtailWeasyTemplateMixin, AsyncPDFDetailView):
+    pass
     
 
 class WagtailWeasyAdminView(WagtailWeasyView):
     permission_required = 'view'
+    pdf_storage = False
 
 
 class CreateView(generic.CreateEditViewOptionalFeaturesMixin, generic.CreateView):
@@ -370,16 +1857,17 @@ class PreviewableViewSetMixin:
 class LiveIndexViewMixin:
     live_app_name = 'wagtail_pdf_view'
 
-    def get_live_url(self, instance):
-        try:
-            name = f"{self.model._meta.app_label}.{self.model._meta.object_name}"
+    def get_live_url_name(self):
+        name = f"{self.model._meta.app_label}.{self.model._meta.object_name}"
+
+        if self.live_app_name:
+            name = self.live_app_name+":"+name
 
-            if self.live_app_name:
-                name = self.live_app_name+":"+name
+        return name
 
-            return reverse(name, args=(quote(instance.pk),))
-        except NoReverseMatch:
-            return ''
+    def get_live_url(self, instance):
+        # the url pattern (and whether it exists) is resolved only once, not for every row
+        return reverse_pk(self.get_live_url_name(), instance.pk) or ''
 
     def get_list_more_buttons(self, instance):
         buttons = super().get_list_more_buttons(instance)
@@ -420,7 +1908,13 @@ class PdfAdminIndexView(LiveIndexViewMixin, generic.IndexView):
                 "Subclasses of PdfAdminIndexView must provide an "
                 "pdf_url_name attribute or a get_pdf_url method"
             )
-        return reverse(self.pdf_url_name, args=(quote(instance.pk),))
+
+        url = reverse_pk(self.pdf_url_name, instance.pk)
+
+        if url is None:
+            raise NoReverseMatch(f"Reverse for '{self.pdf_url_name}' not found.")
+
+        return url
 
     def get_list_buttons(self, instance):
         buttons = super().get_list_buttons(instance)
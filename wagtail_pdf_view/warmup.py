@@ -0,0 +1,174 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.signals import request_started
+
+from wagtail import hooks
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+"""
+Warm up all pdf views in the background, once a worker process handles its first request
+
+True enables the warmup with the default options, a dict may be used to configure the single steps, e.g.
+WAGTAIL_PDF_WARMUP = {'render': False} only preloads the templates and stylesheets.
+"""
+WAGTAIL_PDF_WARMUP = getattr(settings, 'WAGTAIL_PDF_WARMUP', False)
+
+WAGTAIL_PDF_WARMUP_DEFAULTS = {
+    # render a tiny document with every view class
+    'render': True,
+    # include the views registered with the hook 'register_pdf_site_urls'
+    'site_urls': True,
+    # include the pdf views of all models inheriting from BasePdfMixin
+    'models': True,
+}
+
+
+def get_warmup_options():
+    if isinstance(WAGTAIL_PDF_WARMUP, dict):
+        return {**WAGTAIL_PDF_WARMUP_DEFAULTS, **WAGTAIL_PDF_WARMUP}
+
+    return dict(WAGTAIL_PDF_WARMUP_DEFAULTS)
+
+
+def iter_site_url_views(patterns=None):
+    """
+    Yield (view_class, model, initkwargs) for all views registered with 'register_pdf_site_urls'
+    """
+
+    if patterns is None:
+        patterns = []
+
+        for fn in hooks.get_hooks('register_pdf_site_urls'):
+            patterns += fn() or []
+
+    for pattern in patterns:
+        # nested includes
+        if hasattr(pattern, 'url_patterns'):
+            yield from iter_site_url_views(pattern.url_patterns)
+            continue
+
+        view_class = getattr(pattern.callback, 'view_class', None)
+        initkwargs = dict(getattr(pattern.callback, 'view_initkwargs', {}))
+        model = initkwargs.pop('model', getattr(view_class, 'model', None))
+
+        if view_class is not None and model is not None:
+            yield view_class, model, initkwargs
+
+
+def iter_model_views():
+    """
+    Yield (view_class, model, initkwargs) for the pdf views of all models inheriting from BasePdfMixin
+    """
+
+    from .mixins import BasePdfMixin
+
+    for model in apps.get_models():
+        if not issubclass(model, BasePdfMixin):
+            continue
+
+        instance = model()
+        view_classes = [(model.pdf_view_class, instance.get_pdf_view_kwargs())]
+
+        if getattr(model, 'preview_pdf_view_class', None):
+            view_classes.append((model.preview_pdf_view_class, instance.get_preview_pdf_view_kwargs()))
+
+        for view_class, initkwargs in view_classes:
+            initkwargs = {key: value for key, value in initkwargs.items() if hasattr(view_class, key)}
+
+            yield view_class, model, initkwargs
+
+
+def warmup(**options):
+    """
+    Preload the templates and stylesheets of all pdf views and render a tiny document per view class
+
+    Returns a report with the timing of every step, which is also logged.
+    """
+
+    options = {**get_warmup_options(), **options}
+
+    start = time.perf_counter()
+    report = {'views': [], 'duration': 0}
+
+    views = []
+
+    if options['site_urls']:
+        views += iter_site_url_views()
+
+    if options['models']:
+        views += iter_model_views()
+
+    seen = set()
+    rendered = set()
+
+    for view_class, model, initkwargs in views:
+        # the values may be unhashable (e.g. the pdf options), an unequal repr only costs another warmup
+        key = (view_class, model, repr(sorted(initkwargs.items())))
+
+        if key in seen or not hasattr(view_class, 'warmup'):
+            continue
+
+        seen.add(key)
+
+        # a tiny document per response class is sufficient to trigger the lazy initialization
+        render = options['render'] and view_class.response_class not in rendered
+        rendered.add(view_class.response_class)
+
+        label = f"{view_class.__name__}({model._meta.label})"
+        view_start = time.perf_counter()
+        error = None
+
+        try:
+            view_class.warmup(model, render=render, **initkwargs)
+        except Exception as e:
+            error = e
+            logger.warning(f"PDF warmup of {label} failed: {e!r}")
+
+        duration = time.perf_counter() - view_start
+        report['views'].append({'view': label, 'duration': duration, 'rendered': render, 'error': error})
+
+        logger.debug(f"PDF warmup of {label} took {duration:.3f}s")
+
+    report['duration'] = time.perf_counter() - start
+
+    logger.info(f"PDF warmup of {len(report['views'])} views finished in {report['duration']:.3f}s")
+
+    return report
+
+
+_warmup_started = False
+_warmup_lock = threading.Lock()
+
+
+def _store_warmup_report(future):
+    if not future.cancelled() and future.exception() is None:
+        apps.get_app_config('wagtail_pdf_view').warmup_report = future.result()
+
+
+def warmup_on_first_request(sender, **kwargs):
+    """
+    Run the warmup in the render executor, once the process handles its first request
+
+    Unlike AppConfig.ready(), this is neither run by management commands (e.g. migrate)
+    nor in the master process of preforking servers, but in every worker which actually serves requests.
+    """
+
+    global _warmup_started
+
+    with _warmup_lock:
+        if _warmup_started:
+            return
+
+        _warmup_started = True
+
+    request_started.disconnect(warmup_on_first_request)
+
+    from .concurrency import submit_render
+
+    submit_render(warmup).add_done_callback(_store_warmup_report)
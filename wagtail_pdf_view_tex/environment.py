@@ -11,18 +11,38 @@ except ImportError:
 from wagtail import blocks
 from wagtail.contrib.table_block.blocks import TableBlock
 
+import os
 import re
 from html.parser import HTMLParser
 
 from django.utils.safestring import mark_safe
 from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
 
 from markupsafe import Markup
 
+from wagtail_pdf_view.fragments import render_block_cached
+
 
 class WagtailCoreExtensionLatex(WagtailCoreExtension):
     
     def _include_block(self, value, context, use_context, *args):
+        """
+        Render the block or take it from the block cache (see WAGTAIL_PDF_BLOCK_CACHE)
+
+        Only blocks included without the template context (use_context=False) and extra arguments are cached,
+        as the output of the others may depend on them.
+        """
+
+        if use_context or args:
+            return self._render_block(value, context, use_context, *args)
+
+        return Markup(render_block_cached(
+            value, "tex", lambda: self._render_block(value, context, use_context, *args)
+        ))
+
+    def _render_block(self, value, context, use_context, *args):
         """
         Automatically translate richtext blocks into latex
         """
@@ -226,6 +246,60 @@ def richtext_as_tex(richtext):
     return HTML_TO_LATEX_PARSER().parse(html)
 
 
+class DjangoCacheClient:
+    """
+    A django cache with the memcache client interface of jinja2.MemcachedBytecodeCache
+
+    jinja2 omits the timeout if it is None, which would fall back to the default timeout of the django cache,
+    here None keeps the compiled templates forever (like the django cache API).
+    """
+
+    def __init__(self, cache, timeout=None):
+        self.cache = cache
+        self.timeout = timeout
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.cache.set(key, value, timeout=self.timeout if timeout is None else timeout)
+
+
+def get_bytecode_cache(config):
+    """
+    Build a jinja2 bytecode cache from a configuration dict
+
+    Supported backends are 'filesystem' (compiled templates are stored in 'directory')
+    and 'django' (compiled templates are stored in the django cache 'cache', by default without timeout).
+    A ready made jinja2.BytecodeCache instance is returned unchanged.
+    """
+
+    if not config or isinstance(config, jinja2.BytecodeCache):
+        return config or None
+
+    backend = config.get('backend', 'filesystem')
+
+    if backend == 'filesystem':
+        directory = config.get('directory')
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        return jinja2.FileSystemBytecodeCache(directory, config.get('pattern', '__jinja2_%s.cache'))
+
+    if backend == 'django':
+        return jinja2.MemcachedBytecodeCache(
+            DjangoCacheClient(caches[config.get('cache', 'default')], timeout=config.get('timeout')),
+            prefix=config.get('prefix', 'wagtail_pdf_view_tex/bytecode/'),
+        )
+
+    raise ImproperlyConfigured(f"Unknown jinja2 bytecode cache backend '{backend}', use 'filesystem' or 'django'")
+
+
+# Bytecode cache for the latex environment, e.g. {'backend': 'filesystem', 'directory': '/tmp/tex_cache'}
+WAGTAIL_PDF_TEX_BYTECODE_CACHE = getattr(settings, "WAGTAIL_PDF_TEX_BYTECODE_CACHE", None)
+
+
 if django_tex:
     from django_tex.filters import FILTERS
 
@@ -240,6 +314,9 @@ if django_tex:
         
         options["extensions"].append("django_tex.extensions.GraphicspathExtension")
         options["extensions"].append(WagtailCoreExtensionLatex)
+
+        # compiled templates are shared between worker processes and survive restarts
+        options["bytecode_cache"] = get_bytecode_cache(options.get("bytecode_cache", WAGTAIL_PDF_TEX_BYTECODE_CACHE))
         
         # add django-tex filters and richtext filter
         env = jinja2.Environment(**options)
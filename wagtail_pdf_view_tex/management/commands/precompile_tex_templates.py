@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+
+from django_tex.engine import TeXEngine
+
+import jinja2
+
+
+class Command(BaseCommand):
+    """
+    Compile all latex templates ahead of time
+
+    The compiled templates are written to the bytecode cache of the latex environment
+    (see WAGTAIL_PDF_TEX_BYTECODE_CACHE), which allows freshly started workers to render
+    latex templates without parsing and compiling them first.
+    """
+
+    help = "Precompile the latex templates into the jinja2 bytecode cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--using",
+            action="append",
+            help="Name of the latex template engine (default: all latex engines)",
+        )
+        parser.add_argument(
+            "--extension",
+            action="append",
+            help="File extensions of the templates to compile (default: tex)",
+        )
+
+    def handle(self, *args, using=None, extension=None, **options):
+        backends = [
+            engine for engine in engines.all()
+            if isinstance(engine, TeXEngine) and (not using or engine.name in using)
+        ]
+
+        if not backends:
+            raise CommandError("No latex template engine found, check the TEMPLATES setting")
+
+        extensions = extension or ["tex"]
+
+        for engine in backends:
+            env = engine.env
+
+            if env.bytecode_cache is None:
+                self.stderr.write(f"The latex engine '{engine.name}' has no bytecode cache configured, compiling anyway")
+
+            start = time.perf_counter()
+            compiled = 0
+
+            for name in env.list_templates(extensions=extensions):
+                try:
+                    env.get_template(name)
+                except jinja2.TemplateError as e:
+                    self.stderr.write(f"Failed to compile '{name}': {e}")
+                else:
+                    compiled += 1
+
+            self.stdout.write(
+                f"Compiled {compiled} templates for engine '{engine.name}' in {time.perf_counter() - start:.2f}s"
+            )
@@ -1,23 +1,66 @@
 
+from django.conf import settings
+from django.http import HttpRequest
+from django.template.loader import get_template
 from django.template.response import TemplateResponse
 from django.views.generic.base import TemplateResponseMixin
 
-from django_tex.core import compile_template_to_pdf
+from django_tex.core import render_template_with_context, run_tex
 
-from wagtail_pdf_view.views import WagtailAdapterMixin, ConcreteSingleObjectMixin, PDFDetailView
+from wagtail_pdf_view.views import WagtailAdapterMixin, ConcreteSingleObjectMixin, PDFDetailView, AsyncPDFDetailView
 
 
 class TexTemplateResponse(TemplateResponse):
 
+    def get_fingerprint_data(self):
+        """
+        Everything besides the latex source, which affects the rendered document
+        """
+
+        return {
+            'interpreter': getattr(settings, "LATEX_INTERPRETER", None),
+            'interpreter_options': getattr(settings, "LATEX_INTERPRETER_OPTIONS", None),
+            'graphicspath': getattr(settings, "LATEX_GRAPHICSPATH", None),
+        }
+
+    def render_source(self):
+        """
+        Render the template as latex source
+        """
+
+        context = self.resolve_context(self.context_data)
+
+        return render_template_with_context(self.template_name, context)
+
+    def render_pdf(self, source):
+        """
+        Compile the latex source to PDF
+        """
+
+        return run_tex(source, template_name=self.template_name)
+
     @property
     def rendered_content(self):
         """
         Returns rendered PDF pages.
         """
 
-        context = self.resolve_context(self.context_data)
+        return self.render_pdf(self.render_source())
 
-        return compile_template_to_pdf(self.template_name, context)
+    #: minimal document for warming up the latex interpreter
+    warmup_source = "\\documentclass{article}\n\\begin{document}\n.\n\\end{document}\n"
+
+    def warmup(self, render=True):
+        """
+        Load the template and optionally compile a tiny document
+
+        Compiling once fills the font and format caches of the latex interpreter.
+        """
+
+        get_template(self.template_name, using="tex")
+
+        if render:
+            run_tex(self.warmup_source)
 
 
 class WagtailTexTemplateMixin(WagtailAdapterMixin, ConcreteSingleObjectMixin, TemplateResponseMixin):
@@ -47,10 +90,28 @@ class WagtailTexTemplateMixin(WagtailAdapterMixin, ConcreteSingleObjectMixin, Te
         # fallback
         return super().get_template_names()
 
+    @classmethod
+    def warmup(cls, model, render=True, **initkwargs):
+        """
+        Preload the latex template of this view for a model
+
+        A blank instance of the model is used as object, i.e. no database access is required.
+        """
+
+        view = cls(**initkwargs)
+        view.setup(HttpRequest(), object=model())
+
+        response = view.response_class(request=view.request, template=view.get_template_names())
+        response.warmup(render=render)
+
 
 class WagtailTexView(WagtailTexTemplateMixin, PDFDetailView):
     pass
 
 
+class AsyncWagtailTexView(WagtailTexTemplateMixin, AsyncPDFDetailView):
+    pass
+
+
 class WagtailTexAdminView(WagtailTexView):
     permission_required = 'view'